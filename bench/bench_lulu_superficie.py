@@ -0,0 +1,92 @@
+"""
+Prueba de lulu.py: tiempo y memoria máxima para calcular la superficie de
+pérdida sobre una malla de N x N.
+
+Cada caso corre en un proceso nuevo para que la memoria máxima (ru_maxrss)
+sea solo la suya:
+
+  antes      loss de la versión original: meshgrid y temporal (N, N, 3)
+  pool-todo  superficie con pool mandando todos los bloques de una vez
+             (versión anterior de este arreglo)
+  pool       superficie(procesos=2): como mucho 2·procesos bloques en vuelo
+  local      superficie(procesos=1), el valor por defecto
+
+La memoria del proceso principal y la de los procesos del pool se miden por
+separado.
+
+    python bench/bench_lulu_superficie.py [N] [tile]
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np  # noqa: E402
+
+import lulu  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+TILE = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+CASO = sys.argv[3] if len(sys.argv) > 3 else None
+CASOS = ["antes", "pool-todo", "pool", "local"]
+
+
+def loss_antes(w, b):
+    # Versión original: agrega una dimensión para alinear con x, forma (N, N, 3)
+    y_pred = w[..., None] * lulu.x + b[..., None]
+    return np.mean((y_pred - lulu.y) ** 2, axis=-1)
+
+
+def pool_todo(w_vals, b_vals):
+    # Versión anterior de superficie: todos los futuros en vuelo a la vez
+    stats = lulu.estadisticas(lulu.x, lulu.y)
+    salida = np.empty((b_vals.size, w_vals.size))
+    with lulu.ProcessPoolExecutor(max_workers=2) as pool:
+        futuros = {
+            pool.submit(lulu._tile, stats, w_vals[j:j + TILE], b_vals[i:i + TILE]): (i, j)
+            for i in range(0, b_vals.size, TILE)
+            for j in range(0, w_vals.size, TILE)
+        }
+        for futuro, (i, j) in futuros.items():
+            salida[i:i + TILE, j:j + TILE] = futuro.result()
+    return salida
+
+
+def correr(caso):
+    w_vals = np.linspace(-3, 3, N)
+    b_vals = np.linspace(-3, 3, N)
+    inicio = time.perf_counter()
+    if caso == "antes":
+        Z = loss_antes(*np.meshgrid(w_vals, b_vals))
+    elif caso == "pool-todo":
+        Z = pool_todo(w_vals, b_vals)
+    else:
+        Z = lulu.superficie(w_vals, b_vals, lulu.x, lulu.y, tile=TILE, procesos=2 if caso == "pool" else 1)
+    segundos = time.perf_counter() - inicio
+    # ru_maxrss está en KB en Linux
+    principal = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"{segundos} {principal} {hijos} {float(Z[N // 3, N // 5])!r}")
+
+
+if __name__ == "__main__":
+    if CASO is not None:
+        correr(CASO)
+        sys.exit()
+
+    print(f"malla {N} x {N} ({N * N * 8 / 2**20:.0f} MB de resultado), tile {TILE}, {os.cpu_count()} núcleos")
+    print(f"{'caso':>9}  {'tiempo':>7}  {'RSS principal':>13}  {'RSS pool':>9}")
+    referencia = None
+    for caso in CASOS:
+        salida = subprocess.run([sys.executable, __file__, str(N), str(TILE), caso], capture_output=True, text=True)
+        if salida.returncode != 0:
+            print(f"{caso:>9}  falló: {salida.stderr.strip().splitlines()[-1]}")
+            continue
+        segundos, principal, hijos, valor = salida.stdout.split()
+        referencia = referencia or float(valor)
+        assert abs(float(valor) - referencia) < 1e-9
+        pool = f"{float(hijos):>6.0f} MB" if caso.startswith("pool") else f"{'-':>9}"
+        print(f"{caso:>9}  {float(segundos):>6.2f}s  {float(principal):>10.0f} MB  {pool}")
@@ -0,0 +1,181 @@
+"""
+Subidas simultáneas a POST /fotos/ de practica10.py contra el handler
+original (Starlette guarda el formulario completo en un SpooledTemporaryFile
+y después shutil.copyfileobj copia el archivo dentro del event loop).
+
+Levanta practica10 con uvicorn en un subproceso (base SQLite y carpetas en
+un directorio temporal) y envía las subidas por TCP. Mientras suben, otra
+tarea hace peticiones pequeñas (GET de una sesión inexistente, 404) y mide su
+latencia: si la escritura a disco bloquea el event loop, esas peticiones esperan.
+
+Antes de medir cada handler se hace una subida de calentamiento: la primera
+subida a /fotos/ arranca el pool de procesos de las variantes y no debe
+contarse (antes se contaba y era la mayor parte de la diferencia). Además de
+la sonda, que también espera al cliente (en un núcleo compiten por la CPU),
+el servidor mide el retraso de su propio event loop (un sleep de 5 ms que
+despierta tarde) y se leen su tiempo de CPU y los bytes que pasó a write()
+(/proc, solo Linux).
+
+Qué muestra y qué no: el handler nuevo escribe la foto una sola vez (el
+original la escribe dos: el spool de Starlette y la copia) y no copia nada
+dentro del event loop, así que el retraso máximo del loop es menor, sobre
+todo con fotos grandes (con 10 de 50 MB: unos 10 ms contra unos 50 ms). No es
+más rápido en total: calcula el SHA-256 del contenido y guarda la fila en la
+base, que el original no hace (unos 0,15 s de CPU más cada 100 MB), y en una
+máquina de un núcleo ese trabajo compite con el loop y con el cliente.
+
+    python bench/bench_practica10_subidas.py [subidas] [MB por foto]
+"""
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SERVIDOR = len(sys.argv) > 1 and sys.argv[1] == "--servidor"
+SUBIDAS = int(sys.argv[1]) if len(sys.argv) > 1 and not SERVIDOR else 20
+MEGAS = float(sys.argv[2]) if len(sys.argv) > 2 and not SERVIDOR else 5
+CONCURRENCIA = 10
+
+
+def servidor(puerto: int):
+    # Se ejecuta en el subproceso: practica10 más el handler original en /antes/
+    sys.path.insert(0, RAIZ)
+    import uvicorn
+    from fastapi import File, Form, UploadFile
+
+    import practica10
+
+    os.makedirs("antes", exist_ok=True)
+    retrasos = []
+    vigilando = []
+
+    async def vigilar_loop():
+        # Cuánto tarda en despertar un sleep de 5 ms: lo que se atrasa el event loop
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(0.005)
+            retrasos.append(time.perf_counter() - inicio - 0.005)
+
+    @practica10.app.get("/bench/retraso")
+    async def retraso():
+        # Devuelve y reinicia el retraso del loop medido desde la última llamada
+        # (la primera llamada arranca la vigilancia)
+        if not vigilando:
+            vigilando.append(True)
+            practica10.lanzar_en_fondo(vigilar_loop())
+            await asyncio.sleep(0.01)
+        medidos = sorted(retrasos)
+        retrasos.clear()
+        return {"p50": medidos[len(medidos) // 2] * 1000, "maximo": medidos[-1] * 1000}
+
+    @practica10.app.post("/antes/")
+    async def subir_antes(descripcion: str = Form(...), file: UploadFile = File(...)):
+        # El handler original, con un nombre único para no pisar archivos
+        ruta = f"antes/{time.time_ns()}_{file.filename}"
+        with open(ruta, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        return {"msg": "Foto subida correctamente"}
+
+    uvicorn.run(practica10.app, host="127.0.0.1", port=puerto, log_level="warning")
+
+
+def uso_servidor(pid):
+    # Tiempo de CPU (usuario + sistema) y bytes escritos con write() del servidor
+    with open(f"/proc/{pid}/stat") as f:
+        campos = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/io") as f:
+        escritos = int(dict(linea.split(": ") for linea in f.read().splitlines())["wchar"])
+    return cpu, escritos
+
+
+async def medir(http, ruta, pid):
+    semaforo = asyncio.Semaphore(CONCURRENCIA)
+    relleno = bytes(int(MEGAS * 1024 * 1024))
+
+    async def subir(i):
+        # Contenido distinto en cada foto para que no se deduplique
+        contenido = i.to_bytes(4, "big") + os.urandom(16) + relleno
+        async with semaforo:
+            respuesta = await http.post(ruta, data={"descripcion": f"Foto {i}"}, files={"file": (f"f{i}.jpg", contenido)})
+            assert respuesta.status_code == 200, respuesta.text
+
+    # Calentamiento: arranca el pool de variantes y deja que terminen sus tareas
+    await subir(SUBIDAS)
+    await asyncio.sleep(2)
+
+    latencias = []
+    activo = True
+
+    async def sondear():
+        while activo:
+            inicio = time.perf_counter()
+            await http.get("/fotos/subidas/inexistente")
+            latencias.append(time.perf_counter() - inicio)
+            await asyncio.sleep(0.01)
+
+    cpu, escritos = uso_servidor(pid)
+    await http.get("/bench/retraso")
+    sonda = asyncio.create_task(sondear())
+    inicio = time.perf_counter()
+    await asyncio.gather(*(subir(i) for i in range(SUBIDAS)))
+    total = time.perf_counter() - inicio
+    activo = False
+    await sonda
+    cpu_final, escritos_final = uso_servidor(pid)
+    loop = (await http.get("/bench/retraso")).json()
+    latencias.sort()
+    return {
+        "loop_p50": loop["p50"], "loop_maximo": loop["maximo"],
+        "total": total, "p50": latencias[len(latencias) // 2] * 1000, "maximo": latencias[-1] * 1000,
+        "cpu": cpu_final - cpu, "escritos": (escritos_final - escritos) / 2**20,
+    }
+
+
+async def cliente(puerto: int, pid: int):
+    import httpx
+
+    base = f"http://127.0.0.1:{puerto}"
+    async with httpx.AsyncClient(base_url=base, timeout=None, limits=httpx.Limits(max_connections=CONCURRENCIA + 1)) as http:
+        for _ in range(100):
+            try:
+                await http.get("/fotos/subidas/inexistente")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        print(f"{SUBIDAS} subidas de {MEGAS:g} MB, {CONCURRENCIA} simultáneas (uvicorn, 1 worker)")
+        print(
+            f"{'handler':<8} {'total (s)':>9} {'MB/s':>7} {'sonda p50 (ms)':>15} {'sonda máx (ms)':>15}"
+            f" {'loop p50 (ms)':>14} {'loop máx (ms)':>14} {'CPU (s)':>8} {'MB escritos':>12}"
+        )
+        for nombre, ruta in [("antes", "/antes/"), ("ahora", "/fotos/")]:
+            r = await medir(http, ruta, pid)
+            print(
+                f"{nombre:<8} {r['total']:>9.2f} {SUBIDAS * MEGAS / r['total']:>7.1f} {r['p50']:>15.1f}"
+                f" {r['maximo']:>15.1f} {r['loop_p50']:>14.1f} {r['loop_maximo']:>14.1f}"
+                f" {r['cpu']:>8.2f} {r['escritos']:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    if SERVIDOR:
+        servidor(int(sys.argv[2]))
+        sys.exit()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        puerto = s.getsockname()[1]
+    directorio = tempfile.mkdtemp()
+    entorno = dict(os.environ, DATABASE_URL="sqlite:///fotos.db", MAX_TAMANO_FOTO=str(64 * 1024 * 1024))
+    proceso = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--servidor", str(puerto)], cwd=directorio, env=entorno)
+    try:
+        asyncio.run(cliente(puerto, proceso.pid))
+    finally:
+        proceso.terminate()
+        proceso.wait()
+        shutil.rmtree(directorio, ignore_errors=True)
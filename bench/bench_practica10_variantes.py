@@ -0,0 +1,175 @@
+"""
+Prueba de practica10.py: bytes y peticiones al volver a cargar la galería con
+distintas cabeceras de caché, para las miniaturas y para las fotos originales.
+
+Se suben FOTOS imágenes y un cliente con caché HTTP (frescura por max-age,
+revalidación con If-None-Match) visita la galería VISITAS veces, una cada
+INTERVALO horas de un reloj simulado. Se comparan estas formas de pedir cada
+imagen:
+
+  miniaturas
+    antes      /fotos/{id}/variantes/thumb con "public, max-age=86400"
+    no-cache   /fotos/{id}/variantes/thumb con "no-cache" (revalida siempre)
+    inmutable  /media/variantes/<sha256>_thumb_... con CACHE_INMUTABLE
+  originales
+    uploads    /uploads/<archivo>, el montaje StaticFiles con que se servían
+               las fotos: ETag y Last-Modified pero sin Cache-Control
+    media      /media/<sha256>.jpg con CACHE_INMUTABLE
+
+La fila "antes" se obtiene registrando el manejador anterior en /antes/.
+Después de la primera visita la primera foto pasa a otra imagen (su fila
+apunta al contenido nuevo, como tras una edición); con max-age la URL por id
+sigue entregando la miniatura vieja desde la caché hasta que vence. La
+columna "obsoletas" cuenta las imágenes mostradas con contenido viejo.
+
+Sin Cache-Control la caché modelada revalida en cada visita. Un navegador
+puede usar la frescura heurística (10 % del tiempo desde Last-Modified), pero
+con visitas cada 12 h y una foto recién subida no alcanza a la siguiente
+visita. Las respuestas 304 no llevan cuerpo, así que los KB de cuerpo son
+iguales entre esquemas; la diferencia está en las peticiones (una ida y
+vuelta cada una) y en los KB de cabeceras.
+
+    python bench/bench_practica10_variantes.py [fotos] [visitas] [intervalo_horas]
+"""
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = "sqlite:///fotos.db"
+
+from fastapi import Request  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import practica10  # noqa: E402
+
+FOTOS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+VISITAS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+INTERVALO = float(sys.argv[3]) if len(sys.argv) > 3 else 12.0
+
+
+# Manejador de la versión anterior: misma variante, caché de un día en una URL por id
+@practica10.app.get("/antes/fotos/{id}/variantes/{nombre}")
+async def variante_antes(id: int, nombre: str, request: Request):
+    foto = await practica10.run_in_threadpool(practica10.buscar_foto, id)
+    destino = await practica10.asegurar_variante(foto, nombre)
+    return await practica10.servir_archivo(request, destino, "public, max-age=86400")
+
+
+def imagen(semilla):
+    # Ruido: la miniatura no se comprime a casi nada como una imagen lisa
+    aleatorio = random.Random(semilla)
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (1024, 768), aleatorio.randbytes(1024 * 768 * 3)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def subir(cliente, semilla):
+    respuesta = cliente.post("/fotos/", data={"descripcion": f"Foto {semilla}"}, files={"file": (f"{semilla}.jpg", imagen(semilla), "image/jpeg")})
+    return respuesta.json()["foto"]
+
+
+class Cache:
+    """Caché privada del navegador: URL -> (etag, vence, cuerpo)."""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.entradas = {}
+        self.peticiones = 0
+        self.bytes = 0
+        self.cabeceras = 0
+
+    def pedir(self, url, ahora):
+        entrada = self.entradas.get(url)
+        if entrada is not None and ahora < entrada[1]:
+            return entrada[2]
+        cabeceras = {"If-None-Match": entrada[0]} if entrada is not None else {}
+        respuesta = self.cliente.get(url, headers=cabeceras)
+        self.peticiones += 1
+        self.bytes += len(respuesta.content)
+        # Línea de estado y cabeceras de la respuesta, con sus saltos de línea
+        self.cabeceras += len(f"HTTP/1.1 {respuesta.status_code} {respuesta.reason_phrase}\r\n\r\n")
+        self.cabeceras += sum(len(nombre) + len(valor) + 4 for nombre, valor in respuesta.headers.raw)
+        cuerpo = entrada[2] if respuesta.status_code == 304 else respuesta.content
+        edad = re.search(r"max-age=(\d+)", respuesta.headers.get("cache-control", ""))
+        vence = ahora + int(edad.group(1)) if edad and "no-cache" not in respuesta.headers["cache-control"] else ahora
+        self.entradas[url] = (respuesta.headers.get("etag"), vence, cuerpo)
+        return cuerpo
+
+
+def medir(cliente, galeria, url_de):
+    cache = Cache(cliente)
+    obsoletas = 0
+    inicio = time.perf_counter()
+    for visita in range(VISITAS):
+        ahora = visita * INTERVALO * 3600
+        lista, esperadas = galeria(visita)
+        for foto, esperada in zip(lista, esperadas):
+            if cache.pedir(url_de(foto), ahora) != esperada:
+                obsoletas += 1
+    return cache.peticiones, cache.bytes, cache.cabeceras, obsoletas, time.perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    cliente = TestClient(practica10.app)
+    fotos = [subir(cliente, semilla) for semilla in range(FOTOS)]
+    for foto in fotos:
+        cliente.get(foto["variantes"]["thumb"])
+
+    # A partir de la segunda visita la fila de la primera foto apunta a otra imagen
+    nueva = subir(cliente, FOTOS)
+    cliente.get(nueva["variantes"]["thumb"])
+    db = practica10.SessionLocal()
+    vieja, reemplazo = db.get(practica10.Foto, fotos[0]["id"]), db.get(practica10.Foto, nueva["id"])
+    original = (vieja.ruta_foto, vieja.sha256)
+
+    def con_contenido(ruta, sha256):
+        vieja.ruta_foto, vieja.sha256 = ruta, sha256
+        db.commit()
+
+    def contenido_thumb(foto):
+        sha256 = os.path.splitext(os.path.basename(foto["ruta_foto"]))[0]
+        return open(practica10.ruta_variante(practica10.Foto(sha256=sha256), "thumb"), "rb").read()
+
+    def contenido_original(foto):
+        return open(foto["ruta_foto"], "rb").read()
+
+    galeria_inicial = fotos
+    galeria_nueva = [dict(fotos[0], ruta_foto=nueva["ruta_foto"], url=nueva["url"], variantes=nueva["variantes"])] + fotos[1:]
+
+    print(f"{FOTOS} fotos, {VISITAS} visitas cada {INTERVALO:.0f} h; la foto 1 cambia tras la primera visita")
+    # KB de cuerpo: los 304 no llevan cuerpo, solo cabeceras
+    print(f"{'esquema':>10}  {'peticiones':>10}  {'KB cuerpo':>10}  {'KB cabeceras':>12}  {'obsoletas':>9}  {'tiempo':>7}")
+    tablas = [
+        ("miniaturas", contenido_thumb, [
+            ("antes", lambda foto: f"/antes/fotos/{foto['id']}/variantes/thumb"),
+            ("no-cache", lambda foto: f"/fotos/{foto['id']}/variantes/thumb"),
+            ("inmutable", lambda foto: foto["variantes"]["thumb"]),
+        ]),
+        ("originales", contenido_original, [
+            ("uploads", lambda foto: f"/uploads/{os.path.basename(foto['ruta_foto'])}"),
+            ("media", lambda foto: foto["url"]),
+        ]),
+    ]
+    for titulo, contenido, esquemas in tablas:
+        print(titulo)
+        for nombre, url_de in esquemas:
+            con_contenido(*original)
+
+            def galeria(visita):
+                if visita == 1:
+                    con_contenido(reemplazo.ruta_foto, reemplazo.sha256)
+                lista = galeria_inicial if visita == 0 else galeria_nueva
+                return lista, [contenido(foto) for foto in lista]
+
+            peticiones, cuerpo, cabeceras, obsoletas, segundos = medir(cliente, galeria, url_de)
+            print(
+                f"{nombre:>10}  {peticiones:>10}  {cuerpo / 1024:>10.0f}  {cabeceras / 1024:>12.1f}"
+                f"  {obsoletas:>9}  {segundos:>6.2f}s"
+            )
@@ -0,0 +1,79 @@
+"""
+Prueba de carga de practica5.py: lecturas por segundo de /consultar según el
+número de hilos, con un hilo escribiendo en paralelo todo el tiempo.
+
+Cada hilo usa su propia conexión WAL (obtener_conexion), como los hilos del
+threadpool de FastAPI. Se llama a los endpoints directamente para medir la
+base de datos y no el servidor HTTP.
+
+    python bench/bench_practica5_lecturas.py [filas] [segundos]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["ALUMNOS_DB"] = os.path.join(tempfile.mkdtemp(), "alumnos.db")
+
+import practica5  # noqa: E402
+
+FILAS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+SEGUNDOS = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+HILOS = [1, 2, 4, 8]
+GRUPOS = ["A", "B", "C", "D", "E"]
+
+
+def sembrar():
+    conn = practica5.obtener_conexion()
+    with conn:
+        conn.executemany(
+            "INSERT INTO alumnos (nombre, edad, correo, grupo, origen) VALUES (?, ?, ?, ?, ?)",
+            (
+                (f"Alumno {i}", 5 + i % 90, f"alumno{i}@escuela.mx", GRUPOS[i % len(GRUPOS)], "rural" if i % 2 else "urbano")
+                for i in range(FILAS)
+            ),
+        )
+
+
+def lector(fin, contador, indice):
+    lecturas = 0
+    while time.perf_counter() < fin:
+        # Consulta típica del panel: un grupo y edad mínima, primera página
+        practica5.consultar(grupo=GRUPOS[lecturas % len(GRUPOS)], edad_minima=18, after_id=None, limit=100, stream=False)
+        lecturas += 1
+    contador[indice] = lecturas
+
+
+def escritor(fin, escrituras):
+    i = 0
+    while time.perf_counter() < fin:
+        practica5.registrar(practica5.Alumno(
+            nombre="Escritor", edad=20, correo=f"escritor{time.time_ns()}_{i}@escuela.mx", grupo="A", origen="urbano",
+        ))
+        i += 1
+    escrituras.append(i)
+
+
+def medir(hilos):
+    fin = time.perf_counter() + SEGUNDOS
+    contador = [0] * hilos
+    escrituras = []
+    hilo_escritor = threading.Thread(target=escritor, args=(fin, escrituras))
+    hilo_escritor.start()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        for indice in range(hilos):
+            pool.submit(lector, fin, contador, indice)
+    hilo_escritor.join()
+    return sum(contador) / SEGUNDOS, escrituras[0] / SEGUNDOS
+
+
+if __name__ == "__main__":
+    sembrar()
+    print(f"{FILAS} filas, {SEGUNDOS:.0f} s por medición, 1 escritor concurrente")
+    print(f"{'hilos':>5}  {'lecturas/s':>11}  {'escrituras/s':>12}")
+    for hilos in HILOS:
+        lecturas, escrituras = medir(hilos)
+        print(f"{hilos:>5}  {lecturas:>11.0f}  {escrituras:>12.0f}")
@@ -0,0 +1,53 @@
+"""
+Compara registrar N alumnos con N peticiones POST /registrar contra una sola
+petición POST /registrar/lote en practica5.py. Usa TestClient (en proceso) y
+una base de datos temporal nueva para cada caso.
+
+    python bench/bench_practica5_lote.py [alumnos]
+"""
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+ALUMNOS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+
+def nueva_app():
+    # Cada caso importa practica5 de nuevo sobre una base vacía
+    os.environ["ALUMNOS_DB"] = os.path.join(tempfile.mkdtemp(), "alumnos.db")
+    sys.modules.pop("practica5", None)
+    return TestClient(importlib.import_module("practica5").app)
+
+
+def alumnos():
+    return [
+        {"nombre": f"Alumno {i}", "edad": 5 + i % 90, "correo": f"alumno{i}@escuela.mx", "grupo": "ABCDE"[i % 5], "origen": "rural"}
+        for i in range(ALUMNOS)
+    ]
+
+
+def por_fila(cliente, datos):
+    for alumno in datos:
+        cliente.post("/registrar", json=alumno)
+
+
+def por_lote(cliente, datos):
+    respuesta = cliente.post("/registrar/lote", json=datos)
+    assert respuesta.json()["insertados"] == len(datos)
+
+
+if __name__ == "__main__":
+    datos = alumnos()
+    print(f"{ALUMNOS} alumnos")
+    for nombre, funcion in [("/registrar x N", por_fila), ("/registrar/lote", por_lote)]:
+        cliente = nueva_app()
+        inicio = time.perf_counter()
+        funcion(cliente, datos)
+        segundos = time.perf_counter() - inicio
+        print(f"{nombre:<16} {segundos:8.2f} s  {ALUMNOS / segundos:10.0f} alumnos/s")
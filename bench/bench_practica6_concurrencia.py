@@ -0,0 +1,94 @@
+"""
+Peticiones por segundo de GET /alumnos/ (una página de 20) en practica6.py
+con distintos niveles de concurrencia. Compara el motor asíncrono actual
+contra el esquema anterior: handler síncrono con Session en el threadpool.
+
+Ambos usan la misma base SQLite temporal (aiosqlite / sqlite3) y se llaman
+en proceso con httpx.ASGITransport, sin servidor HTTP.
+
+    python bench/bench_practica6_concurrencia.py [peticiones]
+"""
+import asyncio
+import importlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+PETICIONES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+CONCURRENCIAS = [1, 10, 50]
+FILAS = 20000
+
+ruta_db = os.path.join(tempfile.mkdtemp(), "escuela.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{ruta_db}"
+practica6 = importlib.import_module("practica6")
+
+
+def app_sincrona():
+    # Equivalente al practica6.py anterior: SessionLocal() a mano en un def
+    engine = create_engine(f"sqlite:///{ruta_db}")
+    SessionLocal = sessionmaker(bind=engine)
+    app = FastAPI()
+
+    @app.get("/alumnos/")
+    def listar(after_id: int = 0, limit: int = 20):
+        db = SessionLocal()
+        try:
+            filas = db.execute(
+                select(practica6.Alumno).where(practica6.Alumno.id > after_id).order_by(practica6.Alumno.id).limit(limit)
+            ).scalars().all()
+            return [{"id": a.id, "nombre": a.nombre, "edad": a.edad, "carrera": a.carrera} for a in filas]
+        finally:
+            db.close()
+
+    return app
+
+
+async def sembrar():
+    async with practica6.engine.begin() as conn:
+        await conn.run_sync(practica6.Base.metadata.create_all)
+    async with practica6.SessionLocal() as db:
+        registros = [{"nombre": f"Alumno {i}", "edad": 18 + i % 10, "carrera": "ISC"} for i in range(FILAS)]
+        await practica6.insertar_lote(db, practica6.Alumno, registros)
+
+
+async def medir(app, concurrencia):
+    cola = asyncio.Queue()
+    for _ in range(PETICIONES):
+        cola.put_nowait(random.randrange(FILAS))
+
+    async def cliente(http):
+        while not cola.empty():
+            after_id = cola.get_nowait()
+            respuesta = await http.get("/alumnos/", params={"after_id": after_id, "limit": 20})
+            assert respuesta.status_code == 200
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as http:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http) for _ in range(concurrencia)))
+        return PETICIONES / (time.perf_counter() - inicio)
+
+
+async def main():
+    await sembrar()
+    sincrona = app_sincrona()
+    print(f"{PETICIONES} peticiones por medición, {FILAS} filas")
+    print(f"{'concurrencia':>12}  {'síncrono req/s':>14}  {'asíncrono req/s':>15}")
+    for concurrencia in CONCURRENCIAS:
+        antes = await medir(sincrona, concurrencia)
+        ahora = await medir(practica6.app, concurrencia)
+        print(f"{concurrencia:>12}  {antes:>14.0f}  {ahora:>15.0f}")
+    await practica6.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
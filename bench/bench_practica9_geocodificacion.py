@@ -0,0 +1,110 @@
+"""
+Prueba de carga de la geocodificación de practica9.py contra un servidor
+local que imita a Nominatim con latencia inyectada (sin red externa).
+
+Compara, para el mismo número de check-ins simultáneos:
+  - antes: petición síncrona sin timeout ni reutilización de conexión,
+    ejecutada en el threadpool (como el requests.get original)
+  - ahora: GeocodificadorNominatim (httpx asíncrono, keep-alive, timeout,
+    límite de concurrencia y circuit breaker)
+
+Escenarios: servicio sano (latencia baja) y servicio lento (latencia mayor
+que GEO_TIMEOUT, donde el circuito debe abrirse y responder al instante).
+
+    python bench/bench_practica9_geocodificacion.py [check-ins]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'asistencia.db')}")
+
+import httpx  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+
+import practica9  # noqa: E402
+
+CHECKINS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+CONCURRENCIA = 40  # igual que el threadpool por defecto de FastAPI
+TIMEOUT = 0.5
+ESCENARIOS = [("sano", 0.05), ("lento", 2.0)]
+
+
+class Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class Stub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # permite keep-alive
+    latencia = 0.0
+
+    def do_GET(self):
+        time.sleep(Stub.latencia)
+        cuerpo = json.dumps({"address": {"road": "Av. Juárez", "house_number": "1", "city": "CDMX"}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def geocodificar_antes(url, lat, lon):
+    # Una conexión nueva por llamada y sin timeout
+    respuesta = httpx.get(url, params={"format": "json", "lat": lat, "lon": lon},
+                          headers={"User-Agent": "FastAPIApp/1.0"}, timeout=None)
+    return practica9.formatear_direccion(respuesta.json())
+
+
+async def medir(funcion):
+    semaforo = asyncio.Semaphore(CONCURRENCIA)
+    latencias = []
+    respaldos = 0
+
+    async def checkin(i):
+        nonlocal respaldos
+        async with semaforo:
+            inicio = time.perf_counter()
+            address = await funcion(19.43 + i * 1e-3, -99.13)
+            latencias.append(time.perf_counter() - inicio)
+            respaldos += address == practica9.DIRECCION_NO_DISPONIBLE
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(checkin(i) for i in range(CHECKINS)))
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return CHECKINS / total, latencias[len(latencias) // 2], latencias[int(len(latencias) * 0.99)], respaldos
+
+
+async def main():
+    servidor = Servidor(("127.0.0.1", 0), Stub)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/reverse"
+
+    print(f"{CHECKINS} check-ins, {CONCURRENCIA} simultáneos, GEO_TIMEOUT={TIMEOUT}s")
+    print(f"{'escenario':<10} {'versión':<7} {'check-ins/s':>11} {'p50 (s)':>8} {'p99 (s)':>8} {'sin dirección':>13}")
+    for nombre, latencia in ESCENARIOS:
+        Stub.latencia = latencia
+        ahora = practica9.GeocodificadorNominatim(url=url, timeout=TIMEOUT, concurrencia=CONCURRENCIA)
+        resultados = [
+            ("antes", lambda lat, lon: run_in_threadpool(geocodificar_antes, url, lat, lon)),
+            ("ahora", ahora),
+        ]
+        for version, funcion in resultados:
+            por_segundo, p50, p99, respaldos = await medir(funcion)
+            print(f"{nombre:<10} {version:<7} {por_segundo:>11.1f} {p50:>8.3f} {p99:>8.3f} {respaldos:>13}")
+        await ahora.cerrar()
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Siembra P9_attendance con un millón de registros y mide la latencia de
+/attendance/history para un usuario con mucho historial: primera página,
+una página profunda por cursor y una ventana de un día. Como referencia se
+mide también la consulta anterior (todo el historial del usuario con .all()).
+
+Usa una base SQLite temporal; con DATABASE_URL se puede apuntar a MySQL.
+
+    python bench/bench_practica9_historial.py [filas]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'asistencia.db')}")
+
+from fastapi import Response  # noqa: E402
+
+import practica9  # noqa: E402
+from practica9 import Attendance, User  # noqa: E402
+
+FILAS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+USUARIOS = 1000
+# El usuario 1 tiene la quinta parte de los registros (varios años de check-ins)
+USUARIO_PESADO = 1
+INICIO = datetime(2020, 1, 1)
+REPETICIONES = 20
+BLOQUE = 50000
+
+
+def sembrar():
+    db = practica9.SessionLocal()
+    try:
+        db.execute(User.__table__.insert(), [
+            {"user_id": u, "username": f"usuario{u}", "password_hash": "x"} for u in range(1, USUARIOS + 1)
+        ])
+        for inicio in range(0, FILAS, BLOQUE):
+            db.execute(Attendance.__table__.insert(), [
+                {
+                    "user_id": USUARIO_PESADO if i % 5 == 0 else 2 + i % (USUARIOS - 1),
+                    "latitude": 19.43,
+                    "longitude": -99.13,
+                    "address": "Av. Juárez #1, CDMX",
+                    "registered_at": INICIO + timedelta(minutes=i),
+                }
+                for i in range(inicio, min(inicio + BLOQUE, FILAS))
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def historial(**parametros):
+    db = practica9.SessionLocal()
+    try:
+        argumentos = {"since": None, "until": None, "before": None, "before_id": None, "limit": 100}
+        argumentos.update(parametros)
+        return practica9.get_attendance_history(response=Response(), user_id=USUARIO_PESADO, db=db, **argumentos)
+    finally:
+        db.close()
+
+
+def historial_anterior():
+    # La versión original: todo el historial del usuario, sin límite
+    db = practica9.SessionLocal()
+    try:
+        return db.query(Attendance).filter(Attendance.user_id == USUARIO_PESADO).order_by(Attendance.registered_at).all()
+    finally:
+        db.close()
+
+
+def medir(funcion, repeticiones=REPETICIONES):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        filas = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1000, len(filas)
+
+
+if __name__ == "__main__":
+    inicio = time.perf_counter()
+    sembrar()
+    print(f"{FILAS} filas sembradas en {time.perf_counter() - inicio:.1f} s; usuario {USUARIO_PESADO} tiene {FILAS // 5}")
+
+    # Cursor a la mitad del historial del usuario
+    medio = INICIO + timedelta(minutes=FILAS // 2)
+    casos = [
+        ("primera página (100)", lambda: historial()),
+        ("página a la mitad (cursor)", lambda: historial(before=medio, before_id=FILAS // 2)),
+        ("ventana de un día", lambda: historial(since=medio, until=medio + timedelta(days=1), limit=1000)),
+        ("anterior: .all() sin límite", historial_anterior),
+    ]
+    print(f"{'consulta':<30} {'mediana (ms)':>12} {'filas':>8}")
+    for nombre, funcion in casos:
+        repeticiones = 3 if funcion is historial_anterior else REPETICIONES
+        ms, filas = medir(funcion, repeticiones)
+        print(f"{nombre:<30} {ms:>12.2f} {filas:>8}")
@@ -0,0 +1,79 @@
+"""
+Logins por segundo de POST /login/ en practica9.py para cada configuración
+de costo del hash (PBKDF2 con distintas iteraciones y scrypt con distintos N).
+
+La verificación corre en el pool de procesos del evento de arranque
+(HASH_PROCESOS procesos); la base es SQLite temporal. Los hashes se generan
+con el costo de cada fila, así el login no tiene que rehacerlos.
+
+    python bench/bench_practica9_login.py [logins]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'asistencia.db')}")
+
+import httpx  # noqa: E402
+
+import practica9  # noqa: E402
+import practica9_hash  # noqa: E402
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+CONFIGURACIONES = [
+    ("pbkdf2_sha256", {"PBKDF2_ITERACIONES": 100_000}),
+    ("pbkdf2_sha256", {"PBKDF2_ITERACIONES": 300_000}),
+    ("pbkdf2_sha256", {"PBKDF2_ITERACIONES": 600_000}),
+    ("scrypt", {"SCRYPT_N": 2 ** 14}),
+    ("scrypt", {"SCRYPT_N": 2 ** 15}),
+]
+
+
+def crear_usuario(username):
+    db = practica9.SessionLocal()
+    try:
+        db.add(practica9.User(username=username, password_hash=practica9_hash.hash_password("secreta"), full_name="Bench"))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def medir(http, username):
+    concurrencia = 2 * practica9.HASH_PROCESOS
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def login():
+        async with semaforo:
+            respuesta = await http.post("/login/", json={"username": username, "password": "secreta"})
+            assert respuesta.status_code == 200, respuesta.text
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(LOGINS)))
+    return LOGINS / (time.perf_counter() - inicio)
+
+
+async def main():
+    await practica9.iniciar_pool_hash()
+    transporte = httpx.ASGITransport(app=practica9.app)
+    print(f"{LOGINS} logins por configuración, {practica9.HASH_PROCESOS} procesos de hash")
+    print(f"{'algoritmo':<14} {'costo':<26} {'logins/s':>9}")
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as http:
+        for i, (algoritmo, costo) in enumerate(CONFIGURACIONES):
+            practica9_hash.PASSWORD_ALGORITMO = algoritmo
+            for nombre, valor in costo.items():
+                setattr(practica9_hash, nombre, valor)
+            username = f"usuario{i}"
+            crear_usuario(username)
+            # Primer login fuera de la medición: arranca los procesos del pool
+            await http.post("/login/", json={"username": username, "password": "secreta"})
+            por_segundo = await medir(http, username)
+            descripcion = ", ".join(f"{k}={v}" for k, v in costo.items())
+            print(f"{algoritmo:<14} {descripcion:<26} {por_segundo:>9.1f}")
+    practica9._pool_hash.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1 @@
+# Permite que las pruebas de tests/ importen los módulos de la raíz (p4U3, practica9, ...)
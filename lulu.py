@@ -1,21 +1,292 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 
 x = np.array([1, 2, 3], dtype=float)
 y = np.array([2, 3, 5], dtype=float)
 
+def estadisticas(x, y):
+    # Estadísticas suficientes del MSE de una recta: con ellas cada punto de
+    # la malla cuesta O(1) sin importar cuántos datos haya.
+    # Se usan centradas (varianzas y covarianza) para no perder precisión
+    # al restar números grandes.
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    mx = x.mean()
+    my = y.mean()
+    dx = x - mx
+    dy = y - my
+    return n, mx, my, dx @ dx, dx @ dy, dy @ dy
+
+def loss_stats(w, b, stats):
+    # MSE = (w²·Sxx - 2w·Sxy + Syy)/n + (w·mx + b - my)²
+    # w y b pueden ser escalares o matrices de cualquier forma (se hace broadcasting)
+    n, mx, my, sxx, sxy, syy = stats
+    w = np.asarray(w, dtype=float)
+    b = np.asarray(b, dtype=float)
+    return (w * (w * sxx - 2 * sxy) + syy) / n + (w * mx + b - my) ** 2
+
 def loss(w, b):
     # w y b pueden ser escalares o matrices (50x50)
-    # Les agregamos una dimension extra al final para que "alineen" con x (3,)
-    y_pred = w[..., None] * x + b[..., None]  # forma: (50,50,3)
-    return np.mean((y_pred - y)**2, axis=-1)  # promedio en los datos, queda (50,50)
-
-W, B = np.meshgrid(np.linspace(-3, 3, 50), np.linspace(-3, 3, 50))
-Z = loss(W, B)
-
-# Gráfica 3D
-fig = plt.figure()
-ax = fig.add_subplot(111, projection='3d')
-ax.plot_surface(W, B, Z, cmap='viridis')
-plt.show()
\ No newline at end of file
+    # Ya no se crea el temporal (50,50,3): se usan las estadísticas de (x, y)
+    return loss_stats(w, b, estadisticas(x, y))
+
+def _tile(stats, w_vals, b_vals):
+    # Calcula un bloque de la superficie; corre dentro de un proceso del pool
+    W, B = np.meshgrid(w_vals, b_vals)
+    return loss_stats(W, B, stats)
+
+def superficie(w_vals, b_vals, x, y, tile=1024, procesos=1, salida=None):
+    """
+    Superficie de pérdida sobre la malla w_vals x b_vals (como np.meshgrid,
+    devuelve forma (len(b_vals), len(w_vals))).
+
+    La malla se calcula por bloques de tile x tile. Cada punto cuesta O(1),
+    así que por defecto (procesos=1) todo corre en el proceso actual: con un
+    pool, copiar cada bloque de vuelta al proceso principal cuesta más que
+    calcularlo. Con procesos > 1 los bloques se reparten en un pool y solo hay
+    2·procesos bloques en vuelo a la vez, para no acumular resultados en
+    memoria. El resultado se escribe en 'salida' si se da (por ejemplo un
+    np.memmap para mallas que no caben en memoria).
+    """
+    w_vals = np.asarray(w_vals, dtype=float)
+    b_vals = np.asarray(b_vals, dtype=float)
+    stats = estadisticas(x, y)
+    if salida is None:
+        salida = np.empty((b_vals.size, w_vals.size))
+
+    bloques = [
+        (i, j)
+        for i in range(0, b_vals.size, tile)
+        for j in range(0, w_vals.size, tile)
+    ]
+    if procesos == 1 or len(bloques) == 1:
+        for i, j in bloques:
+            salida[i:i + tile, j:j + tile] = _tile(stats, w_vals[j:j + tile], b_vals[i:i + tile])
+        return salida
+
+    # procesos=None usa todos los núcleos, como ProcessPoolExecutor
+    procesos = procesos or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_vuelo = deque()
+        for i, j in bloques:
+            if len(en_vuelo) >= 2 * procesos:
+                futuro, (a, c) = en_vuelo.popleft()
+                salida[a:a + tile, c:c + tile] = futuro.result()
+            en_vuelo.append((pool.submit(_tile, stats, w_vals[j:j + tile], b_vals[i:i + tile]), (i, j)))
+        for futuro, (i, j) in en_vuelo:
+            salida[i:i + tile, j:j + tile] = futuro.result()
+    return salida
+
+# ---------------------------------------------------------------------------
+# Ajuste de muchos modelos lineales a la vez
+# ---------------------------------------------------------------------------
+# Los datos van apilados: X y Y de forma (k, m) son k conjuntos independientes
+# de m puntos cada uno (por ejemplo, un conjunto por grupo de alumnos).
+# X y Y pueden ser np.memmap: se leen por bloques de columnas y nunca se
+# cargan completos en memoria.
+# Si los conjuntos tienen distinto tamaño se rellenan hasta m y se indica qué
+# puntos son válidos con 'mascara' (booleana, forma (k, m)) o con
+# 'longitudes' (forma (k,): la fila i usa sus primeras longitudes[i] columnas).
+# El relleno nunca entra en las cuentas, aunque sea NaN.
+
+def _mascara_bloque(mascara, longitudes, j, ancho):
+    # Máscara de las columnas [j, j + ancho), o None si todos los puntos valen
+    if mascara is not None:
+        return np.asarray(mascara[:, j:j + ancho], dtype=bool)
+    if longitudes is not None:
+        return j + np.arange(ancho) < np.asarray(longitudes)[:, None]
+    return None
+
+def _estadisticas_bloque(xb, yb, mb=None):
+    # Estadísticas centradas de un bloque (k, j), una por fila; con la máscara
+    # mb solo cuentan sus puntos (una fila sin puntos queda con n = 0)
+    xb = np.asarray(xb, dtype=float)
+    yb = np.asarray(yb, dtype=float)
+    if mb is None:
+        n = np.full(xb.shape[0], xb.shape[1], dtype=float)
+        mx = xb.mean(axis=1)
+        my = yb.mean(axis=1)
+        dx = xb - mx[:, None]
+        dy = yb - my[:, None]
+    else:
+        n = mb.sum(axis=1).astype(float)
+        mx = np.divide(np.where(mb, xb, 0).sum(axis=1), n, out=np.zeros_like(n), where=n > 0)
+        my = np.divide(np.where(mb, yb, 0).sum(axis=1), n, out=np.zeros_like(n), where=n > 0)
+        dx = np.where(mb, xb - mx[:, None], 0)
+        dy = np.where(mb, yb - my[:, None], 0)
+    return n, mx, my, (dx * dx).sum(axis=1), (dx * dy).sum(axis=1), (dy * dy).sum(axis=1)
+
+def _combinar(a, b):
+    # Une las estadísticas de dos bloques sin volver a leer los datos
+    # (fórmula de Chan et al. para varianzas en paralelo)
+    na, mxa, mya, sxxa, sxya, syya = a
+    nb, mxb, myb, sxxb, sxyb, syyb = b
+    n = na + nb
+    dx = mxb - mxa
+    dy = myb - mya
+    # Proporción del bloque b; 0 si ninguno de los dos tiene puntos
+    pb = np.divide(nb, n, out=np.zeros_like(n), where=n > 0)
+    f = na * pb
+    return (
+        n,
+        mxa + dx * pb,
+        mya + dy * pb,
+        sxxa + sxxb + dx * dx * f,
+        sxya + sxyb + dx * dy * f,
+        syya + syyb + dy * dy * f,
+    )
+
+def estadisticas_lote(X, Y, bloque=65536, mascara=None, longitudes=None):
+    # Estadísticas suficientes de cada fila de X, Y; recorre las columnas por
+    # bloques para que X y Y puedan ser arreglos en disco (np.memmap)
+    X = np.atleast_2d(X)
+    Y = np.atleast_2d(Y)
+    if mascara is not None:
+        mascara = np.atleast_2d(mascara)
+    stats = None
+    for j in range(0, X.shape[1], bloque):
+        mb = _mascara_bloque(mascara, longitudes, j, X[:, j:j + bloque].shape[1])
+        parcial = _estadisticas_bloque(X[:, j:j + bloque], Y[:, j:j + bloque], mb)
+        stats = parcial if stats is None else _combinar(stats, parcial)
+    return stats
+
+def ajuste_cerrado(X, Y, bloque=65536, mascara=None, longitudes=None):
+    """
+    Mínimos cuadrados exactos para cada fila: w = Sxy / Sxx, b = my - w·mx.
+    Devuelve (w, b, loss) como arreglos de forma (k,). Si una fila tiene todas
+    sus x iguales (Sxx = 0) se ajusta solo la ordenada (w = 0); una fila sin
+    puntos válidos queda con w = b = 0 y loss NaN.
+    """
+    stats = estadisticas_lote(X, Y, bloque, mascara, longitudes)
+    n, mx, my, sxx, sxy, syy = stats
+    w = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+    b = my - w * mx
+    return w, b, _perdida_lote(w, b, stats)
+
+def _perdida_lote(w, b, stats):
+    # loss_stats por fila; las filas sin puntos (n = 0) dan NaN sin avisos
+    with np.errstate(divide="ignore", invalid="ignore"):
+        perdida = loss_stats(w, b, stats)
+    return np.where(stats[0] > 0, perdida, np.nan)
+
+def _gradiente(w, b, stats):
+    # Derivadas del MSE respecto a w y b a partir de las estadísticas
+    # (en las filas sin puntos Sxx = Sxy = 0 y el gradiente vale 0)
+    n, mx, my, sxx, sxy, syy = stats
+    error_medio = w * mx + b - my
+    dispersion = np.divide(w * sxx - sxy, n, out=np.zeros_like(sxx), where=n > 0)
+    return 2 * (dispersion + mx * error_medio), 2 * error_medio
+
+def descenso_gradiente(X, Y, lr=0.01, pasos=1000, tol=1e-10, w0=None, b0=None, historial=False, bloque=65536,
+                       mascara=None, longitudes=None):
+    """
+    Descenso de gradiente por lotes completos para k conjuntos a la vez.
+
+    Cada paso cuesta O(k): el gradiente sale de las estadísticas suficientes,
+    que se calculan una sola vez. Un conjunto deja de actualizarse cuando su
+    pérdida baja menos de 'tol' en un paso; el ciclo termina cuando todos
+    convergen o se agotan los pasos. Con 'mascara' o 'longitudes' solo cuentan
+    los puntos válidos; un conjunto sin puntos no se mueve y su loss es NaN.
+
+    Devuelve (w, b, loss, pasos_usados) y, con historial=True, además la
+    trayectoria como arreglo (pasos + 1, k, 3) con (w, b, loss) de cada paso
+    (los conjuntos ya convergidos repiten su último valor).
+    """
+    stats = estadisticas_lote(X, Y, bloque, mascara, longitudes)
+    k = stats[0].shape[0]
+    w = np.zeros(k) if w0 is None else np.array(w0, dtype=float)
+    b = np.zeros(k) if b0 is None else np.array(b0, dtype=float)
+    perdida = _perdida_lote(w, b, stats)
+    # Los conjuntos sin puntos válidos no se actualizan
+    activos = stats[0] > 0
+    usados = np.zeros(k, dtype=np.int64)
+    trayectoria = [np.stack([w, b, perdida], axis=1)] if historial else None
+
+    for _ in range(pasos):
+        gw, gb = _gradiente(w, b, stats)
+        w = np.where(activos, w - lr * gw, w)
+        b = np.where(activos, b - lr * gb, b)
+        nueva = _perdida_lote(w, b, stats)
+        usados += activos
+        activos &= np.abs(perdida - nueva) > tol
+        perdida = nueva
+        if historial:
+            trayectoria.append(np.stack([w, b, perdida], axis=1))
+        if not activos.any():
+            break
+
+    if historial:
+        return w, b, perdida, usados, np.array(trayectoria)
+    return w, b, perdida, usados
+
+def descenso_minilotes(X, Y, lr=0.01, epocas=100, tam_lote=4096, tol=1e-10, w0=None, b0=None,
+                       mascara=None, longitudes=None):
+    """
+    Descenso de gradiente por mini-lotes de columnas para k conjuntos a la vez.
+
+    Pensado para X y Y en disco (np.memmap) que no caben en memoria: en cada
+    paso solo se lee el bloque [j, j + tam_lote) de todas las filas. La pérdida
+    de cada época se acumula con los mismos bloques y se usa para el paro
+    temprano por conjunto (cambio menor que 'tol' entre épocas). Con 'mascara'
+    o 'longitudes' cada mini-lote promedia solo los puntos válidos de cada
+    fila; una fila sin puntos en el lote no se mueve en ese paso.
+
+    Devuelve (w, b, loss_ultima_epoca, epocas_usadas).
+    """
+    X = np.atleast_2d(X)
+    Y = np.atleast_2d(Y)
+    if mascara is not None:
+        mascara = np.atleast_2d(mascara)
+    k, m = X.shape
+    w = np.zeros(k) if w0 is None else np.array(w0, dtype=float)
+    b = np.zeros(k) if b0 is None else np.array(b0, dtype=float)
+    activos = np.ones(k, dtype=bool)
+    usados = np.zeros(k, dtype=np.int64)
+    anterior = np.full(k, np.inf)
+
+    for _ in range(epocas):
+        acumulada = np.zeros(k)
+        puntos = np.zeros(k)
+        for j in range(0, m, tam_lote):
+            xb = np.asarray(X[:, j:j + tam_lote], dtype=float)
+            yb = np.asarray(Y[:, j:j + tam_lote], dtype=float)
+            mb = _mascara_bloque(mascara, longitudes, j, xb.shape[1])
+            residuo = w[:, None] * xb + b[:, None] - yb
+            if mb is None:
+                nb = np.full(k, xb.shape[1], dtype=float)
+            else:
+                # El relleno no aporta al residuo ni al gradiente (aunque sea NaN)
+                residuo = np.where(mb, residuo, 0)
+                xb = np.where(mb, xb, 0)
+                nb = mb.sum(axis=1).astype(float)
+            acumulada += (residuo * residuo).sum(axis=1)
+            puntos += nb
+            gw = 2 * np.divide((residuo * xb).sum(axis=1), nb, out=np.zeros(k), where=nb > 0)
+            gb = 2 * np.divide(residuo.sum(axis=1), nb, out=np.zeros(k), where=nb > 0)
+            w = np.where(activos, w - lr * gw, w)
+            b = np.where(activos, b - lr * gb, b)
+        perdida = np.divide(acumulada, puntos, out=np.full(k, np.nan), where=puntos > 0)
+        # Un conjunto sin puntos no tiene nada que ajustar
+        activos &= puntos > 0
+        usados += activos
+        activos &= np.abs(anterior - perdida) > tol
+        anterior = perdida
+        if not activos.any():
+            break
+    return w, b, anterior, usados
+
+
+if __name__ == "__main__":
+    W, B = np.meshgrid(np.linspace(-3, 3, 50), np.linspace(-3, 3, 50))
+    Z = loss(W, B)
+
+    # Gráfica 3D
+    fig = plt.figure()
+    ax = fig.add_subplot(111, projection='3d')
+    ax.plot_surface(W, B, Z, cmap='viridis')
+    plt.show()
@@ -19,4 +19,33 @@ CREATE TABLE P9_attendance (
     address VARCHAR(255),
     registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES P9_users(user_id)
-);
\ No newline at end of file
+);
+
+-- ----------------------------------------------------------------------
+-- Cambios posteriores a las tablas de arriba. En una base nueva se
+-- ejecuta el archivo completo; en una base ya creada con la versión
+-- anterior de este archivo se ejecuta solo desde aquí (una vez).
+-- practica9.py aplica los mismos cambios al arrancar si faltan.
+-- ----------------------------------------------------------------------
+USE db_gmartin_dapps;
+
+ALTER TABLE P9_attendance
+    -- Geohash de las coordenadas (búsquedas por cercanía)
+    ADD COLUMN geohash VARCHAR(12),
+    -- Llave del cliente móvil (idempotencia de /attendance/batch)
+    ADD COLUMN client_key VARCHAR(64),
+    -- Historial por usuario ordenado por fecha
+    ADD INDEX idx_attendance_user_registered (user_id, registered_at),
+    -- Búsquedas por cercanía: prefijos de geohash
+    ADD INDEX idx_attendance_geohash (geohash),
+    -- Un mismo registro reenviado no se duplica
+    ADD UNIQUE KEY uq_attendance_user_client_key (user_id, client_key);
+
+-- Caché persistente de geocodificación inversa (coordenadas redondeadas)
+CREATE TABLE IF NOT EXISTS P9_geocache (
+    lat_key INT NOT NULL,
+    lon_key INT NOT NULL,
+    address VARCHAR(255) NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (lat_key, lon_key)
+);
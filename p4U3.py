@@ -1,9 +1,8 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Literal
+from typing import Dict, Iterator, List, Optional, Literal
 
 app = FastAPI()
-base_alumnos: List["Alumno"] = []
 
 class Alumno(BaseModel):
     nombre: str = Field(..., min_length=3, max_length=100)
@@ -11,49 +10,100 @@ class Alumno(BaseModel):
     correo: EmailStr
     grupo: str = Field(..., min_length=1)
     origen: Literal["rural", "urbano"]
+
+
+class AlmacenAlumnos:
+    # Guarda los alumnos en orden de registro y mantiene indices hash
+    # (correo, grupo, origen, edad) con las posiciones de cada alumno.
+    def __init__(self):
+        self.alumnos: List[Alumno] = []
+        self.por_correo: Dict[str, int] = {}
+        self.por_grupo: Dict[str, List[int]] = {}
+        self.por_origen: Dict[str, List[int]] = {}
+        self.por_edad: Dict[int, List[int]] = {}
+        # Contadores que se actualizan en cada registro para /estadisticas
+        self.total_por_grupo: Dict[str, int] = {}
+        self.total_por_origen: Dict[str, int] = {"rural": 0, "urbano": 0}
+
+    def __len__(self) -> int:
+        return len(self.alumnos)
+
+    def __iter__(self) -> Iterator[Alumno]:
+        return iter(self.alumnos)
+
+    def existe_correo(self, correo: str) -> bool:
+        return correo in self.por_correo
+
+    def agregar(self, alumno: Alumno) -> None:
+        pos = len(self.alumnos)
+        self.alumnos.append(alumno)
+        self.por_correo[alumno.correo] = pos
+        self.por_grupo.setdefault(alumno.grupo, []).append(pos)
+        self.por_origen.setdefault(alumno.origen, []).append(pos)
+        self.por_edad.setdefault(alumno.edad, []).append(pos)
+        self.total_por_grupo[alumno.grupo] = self.total_por_grupo.get(alumno.grupo, 0) + 1
+        self.total_por_origen[alumno.origen] = self.total_por_origen.get(alumno.origen, 0) + 1
+
+    def filtrar(self, grupo: Optional[str] = None, edad_minima: Optional[int] = None,
+                origen: Optional[str] = None) -> List[Alumno]:
+        # Se recorre solo el indice mas pequeño; los demas filtros se revisan
+        # directamente en cada alumno candidato
+        indices = []
+        if grupo:
+            indices.append(self.por_grupo.get(grupo, []))
+        if origen:
+            indices.append(self.por_origen.get(origen, []))
+        if indices:
+            posiciones = min(indices, key=len)
+        elif edad_minima:
+            # Solo hay filtro de edad: se juntan las cubetas de edades validas
+            posiciones = sorted(
+                p
+                for edad, cubeta in self.por_edad.items()
+                if edad >= edad_minima
+                for p in cubeta
+            )
+        else:
+            return list(self.alumnos)
+
+        resultado = []
+        for p in posiciones:
+            alumno = self.alumnos[p]
+            if grupo and alumno.grupo != grupo:
+                continue
+            if origen and alumno.origen != origen:
+                continue
+            if edad_minima and alumno.edad < edad_minima:
+                continue
+            resultado.append(alumno)
+        return resultado
+
+base_alumnos = AlmacenAlumnos()
     
 
 @app.post("/registrar")
 def registrar_alumno(alumno: Alumno):
-    if any(a.correo == alumno.correo for a in base_alumnos):
+    if base_alumnos.existe_correo(alumno.correo):
         raise HTTPException(status_code=400, detail="El correo ya está registrado.")
-    base_alumnos.append(alumno)
+    base_alumnos.agregar(alumno)
     return {"mensaje": f"Alumno {alumno.nombre} registrado correctamente en el grupo {alumno.grupo}"}
 
 @app.get("/listar")
 def listar_alumnos(grupo: Optional[str] = None, edad_minima: Optional[int] = None, origen: Optional[str]=None):
-    resultado = base_alumnos
-    if grupo:
-        resultado = [a for a in resultado if a.grupo == grupo]
-    if edad_minima:
-        resultado = [a for a in resultado if a.edad >= edad_minima]
-    return resultado
+    return base_alumnos.filtrar(grupo=grupo, edad_minima=edad_minima, origen=origen)
 
 @app.get("/estadisticas")
-def devolver_estatidisticas(grupo: Optional[str] = None):
-    resultado = base_alumnos
+def devolver_estatidisticas(grupo: Optional[str] = None, desglose: bool = False):
+    if desglose:
+        return {
+            "total": len(base_alumnos),
+            "por_grupo": dict(base_alumnos.total_por_grupo),
+            "por_origen": dict(base_alumnos.total_por_origen),
+        }
     if grupo:
-        gg=0
-        for a in resultado:
-            if a.grupo==grupo:
-                gg=gg+1
-                resultado = {"mensaje": f"el total de alumnos resgistrados del grupo: {grupo} es: {gg}"}
-    else:
-                
-        
-        
-        cont=0
-        cont2=0
-        cont3=0
-        
-        for a in resultado:
-            cont=cont+1
-            if a.origen =="rural":
-                cont2=cont2+1
-            elif a.origen =="urbano":
-                cont3=cont3+1
-            resultado= {"mensaje": f"total de registros: {cont} total de rurales: {cont2} total de urbanos: {cont3}"}
-     
-    return resultado
-
-
+        gg = base_alumnos.total_por_grupo.get(grupo, 0)
+        return {"mensaje": f"el total de alumnos resgistrados del grupo: {grupo} es: {gg}"}
+    cont = len(base_alumnos)
+    cont2 = base_alumnos.total_por_origen["rural"]
+    cont3 = base_alumnos.total_por_origen["urbano"]
+    return {"mensaje": f"total de registros: {cont} total de rurales: {cont2} total de urbanos: {cont3}"}
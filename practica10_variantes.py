@@ -0,0 +1,30 @@
+# Generación de miniaturas y vistas previas de practica10.py.
+# Vive en un módulo aparte, sin conexión a la base de datos, porque los
+# procesos del pool de variantes lo importan: importar practica10 en cada
+# proceso crearía el engine, las tablas y las carpetas otra vez.
+
+# Importa os para el renombrado atómico
+import os
+
+# Importa uuid para el nombre del temporal
+import uuid
+
+# Importa Pillow para redimensionar las imágenes
+from PIL import Image, ImageOps
+
+# Genera una variante reducida; corre en un proceso del pool
+# Recibe la imagen original, la ruta destino, el lado máximo, el formato y la calidad
+def generar_variante(origen: str, destino: str, lado: int, formato: str, calidad: int):
+    with Image.open(origen) as imagen:
+        # Respeta la orientación que indica la cámara en los metadatos EXIF
+        imagen = ImageOps.exif_transpose(imagen)
+        # thumbnail reduce la imagen conservando la proporción
+        imagen.thumbnail((lado, lado))
+        if formato == "JPEG" and imagen.mode not in ("RGB", "L"):
+            imagen = imagen.convert("RGB")
+        # Se guarda en un temporal y se renombra para no servir archivos a medias.
+        # El nombre es único: en el threadpool varios hilos del mismo proceso
+        # pueden generar la misma variante a la vez
+        temporal = f"{destino}.{uuid.uuid4().hex}.part"
+        imagen.save(temporal, format=formato, quality=calidad)
+    os.replace(temporal, destino)
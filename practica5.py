@@ -1,14 +1,39 @@
 # Importamos FastAPI y herramientas para validación
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field, EmailStr
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, EmailStr, ValidationError
 from typing import Optional, List,Literal
+import json
+import os
 import sqlite3
+import threading
+import time
 
 # Inicializamos la aplicación FastAPI
 app = FastAPI()
 
+DB_PATH = os.getenv("ALUMNOS_DB", "alumnos.db")
+
+# Cada hilo del threadpool de FastAPI usa su propia conexión, así las
+# peticiones no comparten cursor ni se serializan en una sola conexión
+_local = threading.local()
+
+def obtener_conexion():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=5.0)
+        # WAL permite que las lecturas corran en paralelo con una escritura
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _local.conn = conn
+    return conn
+
 # Conectamos a la base de datos SQLite (se crea automáticamente si no existe)
-conn = sqlite3.connect("alumnos.db", check_same_thread=False)
+conn = obtener_conexion()
 cursor = conn.cursor()
 
 # Creamos la tabla si no existe
@@ -22,8 +47,78 @@ CREATE TABLE IF NOT EXISTS alumnos (
     origen TEXT
 )
 """)
+# Índices para los filtros de /consultar y los GROUP BY de /estadisticas;
+# incluyen el id para que la paginación por id no tenga que ordenar
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_alumnos_grupo_id ON alumnos (grupo, id)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_alumnos_edad_id ON alumnos (edad, id)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_alumnos_origen ON alumnos (origen)")
 conn.commit()
 
+# Tablas resumen que mantienen los triggers, así /estadisticas no recorre alumnos
+cursor.executescript("""
+CREATE TABLE IF NOT EXISTS resumen_grupo (
+    grupo TEXT PRIMARY KEY,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resumen_origen (
+    origen TEXT PRIMARY KEY,
+    total INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_alumnos_insert AFTER INSERT ON alumnos
+BEGIN
+    INSERT INTO resumen_grupo (grupo, total) VALUES (NEW.grupo, 1)
+        ON CONFLICT (grupo) DO UPDATE SET total = total + 1;
+    INSERT INTO resumen_origen (origen, total) VALUES (COALESCE(NEW.origen, 'no_especificado'), 1)
+        ON CONFLICT (origen) DO UPDATE SET total = total + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alumnos_delete AFTER DELETE ON alumnos
+BEGIN
+    UPDATE resumen_grupo SET total = total - 1 WHERE grupo = OLD.grupo;
+    UPDATE resumen_origen SET total = total - 1 WHERE origen = COALESCE(OLD.origen, 'no_especificado');
+    DELETE FROM resumen_grupo WHERE total <= 0;
+    DELETE FROM resumen_origen WHERE total <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alumnos_update AFTER UPDATE OF grupo, origen ON alumnos
+BEGIN
+    UPDATE resumen_grupo SET total = total - 1 WHERE grupo = OLD.grupo;
+    UPDATE resumen_origen SET total = total - 1 WHERE origen = COALESCE(OLD.origen, 'no_especificado');
+    INSERT INTO resumen_grupo (grupo, total) VALUES (NEW.grupo, 1)
+        ON CONFLICT (grupo) DO UPDATE SET total = total + 1;
+    INSERT INTO resumen_origen (origen, total) VALUES (COALESCE(NEW.origen, 'no_especificado'), 1)
+        ON CONFLICT (origen) DO UPDATE SET total = total + 1;
+    DELETE FROM resumen_grupo WHERE total <= 0;
+    DELETE FROM resumen_origen WHERE total <= 0;
+END;
+
+-- Se reconstruyen al arrancar por si la tabla tenía datos antes de los triggers
+BEGIN;
+DELETE FROM resumen_grupo;
+DELETE FROM resumen_origen;
+INSERT INTO resumen_grupo (grupo, total) SELECT grupo, COUNT(*) FROM alumnos GROUP BY grupo;
+INSERT INTO resumen_origen (origen, total)
+    SELECT COALESCE(origen, 'no_especificado'), COUNT(*) FROM alumnos GROUP BY COALESCE(origen, 'no_especificado');
+COMMIT;
+""")
+
+# Caché de /estadisticas; se invalida cada vez que registrar, actualizar o
+# eliminar hacen commit. La versión evita guardar un resultado calculado
+# antes de una invalidación que ocurrió mientras se consultaba. La caché es
+# de cada proceso: las escrituras de otro worker no la invalidan, así que el
+# TTL (segundos) acota cuánto tiempo puede servir conteos viejos.
+CACHE_ESTADISTICAS_TTL = float(os.getenv("CACHE_ESTADISTICAS_TTL", "5"))
+_cache_lock = threading.Lock()
+_cache_estadisticas = None # (vence, estadisticas)
+_cache_version = 0
+
+def invalidar_estadisticas():
+    global _cache_estadisticas, _cache_version
+    with _cache_lock:
+        _cache_estadisticas = None
+        _cache_version += 1
+
 # Definimos el modelo de datos con validaciones
 class Alumno(BaseModel):
     nombre: str = Field(..., min_length=3, max_length=100)
@@ -35,19 +130,125 @@ class Alumno(BaseModel):
 # Endpoint para registrar un alumno (POST con JSON)
 @app.post("/registrar")
 def registrar(alumno: Alumno):
+    conn = obtener_conexion()
     try:
-        cursor.execute("""
-            INSERT INTO alumnos (nombre, edad, correo, grupo, origen)
-            VALUES (?, ?, ?, ?, ?)
-        """, (alumno.nombre, alumno.edad, alumno.correo, alumno.grupo, alumno.origen))
-        conn.commit()
-        return {"mensaje": f"Alumno {alumno.nombre} registrado correctamente"}
+        # 'with conn' hace commit si todo sale bien y rollback si falla; la
+        # conexión es del hilo y no puede quedar con la transacción abierta
+        # (retendría el bloqueo de escritura para las demás conexiones)
+        with conn:
+            conn.execute("""
+                INSERT INTO alumnos (nombre, edad, correo, grupo, origen)
+                VALUES (?, ?, ?, ?, ?)
+            """, (alumno.nombre, alumno.edad, alumno.correo, alumno.grupo, alumno.origen))
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Correo ya registrado")
+    invalidar_estadisticas()
+    return {"mensaje": f"Alumno {alumno.nombre} registrado correctamente"}
+
+# Cantidad de filas que se insertan por transacción en /registrar/lote
+TAMANO_LOTE = 500
+
+def insertar_lote(alumnos):
+    """
+    Inserta una lista de (fila, Alumno) en transacciones de TAMANO_LOTE filas.
+    Devuelve cuántos se insertaron y los correos duplicados que se omitieron.
+    """
+    conn = obtener_conexion()
+    insertados = 0
+    errores = []
+    for inicio in range(0, len(alumnos), TAMANO_LOTE):
+        bloque = alumnos[inicio:inicio + TAMANO_LOTE]
+        # BEGIN IMMEDIATE toma el bloqueo de escritura antes de revisar
+        # duplicados, así ninguna otra petición inserta el mismo correo en medio
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            correos = [alumno.correo for _, alumno in bloque]
+            marcas = ",".join("?" * len(correos))
+            existentes = {
+                fila[0]
+                for fila in conn.execute(
+                    f"SELECT correo FROM alumnos WHERE correo IN ({marcas})", correos
+                )
+            }
+            validos = []
+            for fila, alumno in bloque:
+                if alumno.correo in existentes:
+                    errores.append({"fila": fila, "correo": alumno.correo, "detalle": "Correo ya registrado"})
+                    continue
+                existentes.add(alumno.correo)
+                validos.append((alumno.nombre, alumno.edad, alumno.correo, alumno.grupo, alumno.origen))
+            conn.executemany("""
+                INSERT INTO alumnos (nombre, edad, correo, grupo, origen)
+                VALUES (?, ?, ?, ?, ?)
+            """, validos)
+            conn.commit()
+            insertados += len(validos)
+            invalidar_estadisticas()
+        except Exception:
+            conn.rollback()
+            raise
+    return insertados, errores
+
+# Endpoint para registrar muchos alumnos a la vez (arreglo JSON o NDJSON)
+@app.post("/registrar/lote")
+async def registrar_lote(request: Request):
+    cuerpo = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            registros = [json.loads(linea) for linea in cuerpo.splitlines() if linea.strip()]
+        else:
+            registros = json.loads(cuerpo)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El cuerpo no es JSON/NDJSON válido")
+    if not isinstance(registros, list):
+        raise HTTPException(status_code=400, detail="Se esperaba un arreglo de alumnos")
+
+    alumnos = []
+    errores = []
+    for fila, registro in enumerate(registros):
+        try:
+            alumnos.append((fila, Alumno(**registro)))
+        except (TypeError, ValidationError) as e:
+            detalle = [err["msg"] for err in e.errors()] if isinstance(e, ValidationError) else str(e)
+            errores.append({"fila": fila, "detalle": detalle})
+
+    insertados, duplicados = await run_in_threadpool(insertar_lote, alumnos)
+    errores.extend(duplicados)
+    errores.sort(key=lambda err: err["fila"])
+    return {
+        "mensaje": f"{insertados} alumnos registrados correctamente",
+        "insertados": insertados,
+        "errores": errores,
+    }
+
+# Filas que se leen por cada fetchmany al transmitir /consultar en NDJSON
+TAMANO_PAGINA = 1000
+
+def transmitir_ndjson(query, params):
+    # Conexión propia: StreamingResponse puede pedir cada bloque desde un hilo
+    # distinto del threadpool, pero nunca desde dos hilos a la vez
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    try:
+        cursor = conn.execute(query, params)
+        columnas = [c[0] for c in cursor.description]
+        while True:
+            filas = cursor.fetchmany(TAMANO_PAGINA)
+            if not filas:
+                break
+            yield "".join(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + "\n" for fila in filas)
+    finally:
+        conn.close()
 
 # Endpoint para consultar alumnos (GET con filtros opcionales)
+# Paginación por llave: se pide la siguiente página con after_id = id de la última fila
 @app.get("/consultar")
-def consultar(grupo: Optional[str] = None, edad_minima: Optional[int] = None):
+def consultar(
+    grupo: Optional[str] = None,
+    edad_minima: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    stream: bool = False,
+):
     query = "SELECT * FROM alumnos WHERE 1=1"
     params = []
 
@@ -57,7 +258,18 @@ def consultar(grupo: Optional[str] = None, edad_minima: Optional[int] = None):
     if edad_minima:
         query += " AND edad >= ?"
         params.append(edad_minima)
+    if after_id is not None:
+        query += " AND id > ?"
+        params.append(after_id)
+    query += " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    if stream:
+        return StreamingResponse(transmitir_ndjson(query, params), media_type="application/x-ndjson")
 
+    cursor = obtener_conexion().cursor()
     cursor.execute(query, params)
     datos = cursor.fetchall()
     return datos
@@ -65,19 +277,26 @@ def consultar(grupo: Optional[str] = None, edad_minima: Optional[int] = None):
 # Endpoint para actualizar alumno por ID (PUT con JSON)
 @app.put("/actualizar/{id}")
 def actualizar(id: int, alumno: Alumno):
-    cursor.execute("""
-        UPDATE alumnos
-        SET nombre = ?, edad = ?, correo = ?, grupo = ?, origen = ?
-        WHERE id = ?
-    """, (alumno.nombre, alumno.edad, alumno.correo, alumno.grupo, alumno.origen, id))
-    conn.commit()
+    conn = obtener_conexion()
+    try:
+        with conn:
+            conn.execute("""
+                UPDATE alumnos
+                SET nombre = ?, edad = ?, correo = ?, grupo = ?, origen = ?
+                WHERE id = ?
+            """, (alumno.nombre, alumno.edad, alumno.correo, alumno.grupo, alumno.origen, id))
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail="Correo ya registrado")
+    invalidar_estadisticas()
     return {"mensaje": f"Alumno con ID {id} actualizado"}
 
 # Endpoint para eliminar alumno por ID (DELETE)
 @app.delete("/eliminar/{id}")
 def eliminar(id: int):
-    cursor.execute("DELETE FROM alumnos WHERE id = ?", (id,))
-    conn.commit()
+    conn = obtener_conexion()
+    with conn:
+        conn.execute("DELETE FROM alumnos WHERE id = ?", (id,))
+    invalidar_estadisticas()
     return {"mensaje": f"Alumno con ID {id} eliminado"}
     
 @app.get("/estadisticas")
@@ -87,34 +306,36 @@ def obtener_estadisticas():
     - Total de alumnos registrados.
     - Desglose de alumnos por grupo.
     - Desglose de alumnos por origen (rural/urbano).
+    Los conteos salen de las tablas resumen y se sirven desde caché.
     """
+    global _cache_estadisticas
+    with _cache_lock:
+        if _cache_estadisticas is not None and _cache_estadisticas[0] > time.monotonic():
+            return _cache_estadisticas[1]
+        version = _cache_version
+
     estadisticas = {}
+    cursor = obtener_conexion().cursor()
 
-    # 1. Total de alumnos registrados
     try:
-        cursor.execute("SELECT COUNT(*) FROM alumnos")
-        total_alumnos = cursor.fetchone()[0]
-        estadisticas["total_alumnos_registrados"] = total_alumnos
-
-        # 2. Total por grupo
-        cursor.execute("SELECT grupo, COUNT(*) FROM alumnos GROUP BY grupo")
+        # 1. Total por grupo
+        cursor.execute("SELECT grupo, total FROM resumen_grupo")
         grupos_data = cursor.fetchall()
         # Convertimos la lista de tuplas [('A', 5), ('B', 10)] a un diccionario {'A': 5, 'B': 10}
-        estadisticas["total_por_grupo"] = {grupo: count for grupo, count in grupos_data}
-
-        # 3. Total por origen
-        cursor.execute("SELECT origen, COUNT(*) FROM alumnos GROUP BY origen")
-        origen_data = cursor.fetchall()
-        
-        total_por_origen = {}
-        for origen, count in origen_data:
-            # Manejamos el caso de que 'origen' sea NULL (None en Python)
-            key = origen if origen is not None else "no_especificado"
-            total_por_origen[key] = count
-        
-        estadisticas["total_por_origen"] = total_por_origen
+        total_por_grupo = {grupo: count for grupo, count in grupos_data}
 
-        return estadisticas
-    
+        # 2. Total por origen (los NULL ya vienen como 'no_especificado')
+        cursor.execute("SELECT origen, total FROM resumen_origen")
+        total_por_origen = {origen: count for origen, count in cursor.fetchall()}
+
+        # 3. El total de alumnos es la suma de cualquiera de los desgloses
+        estadisticas["total_alumnos_registrados"] = sum(total_por_origen.values())
+        estadisticas["total_por_grupo"] = total_por_grupo
+        estadisticas["total_por_origen"] = total_por_origen
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al consultar estadísticas: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error al consultar estadísticas: {e}")
+
+    with _cache_lock:
+        if _cache_version == version:
+            _cache_estadisticas = (time.monotonic() + CACHE_ESTADISTICAS_TTL, estadisticas)
+    return estadisticas
@@ -1,20 +1,265 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, EmailStr
-from typing import List
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import List, Optional
+from sqlalchemy import Column, Integer, String, bindparam, delete, insert, select, update
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from fastapi.middleware.cors import CORSMiddleware  
+from collections import OrderedDict
+import json
+import os
+import time
 
-# Conexión a MySQL
+# Conexión a MySQL (driver asíncrono aiomysql)
 # Usuario=root; contraseña:escuela_2025; servidor:localhostM db:db_escuela;
 # Estos parámetros deberás cambiarlos por los de tu servidor local.
+# Para pruebas locales se puede usar SQLite: DATABASE_URL=sqlite+aiosqlite:///./escuela.db
 
 
-DATABASE_URL = "mysql+mysqlconnector://root@localhost/db_escuela"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+aiomysql://root@localhost/db_escuela")
+
+# Parámetros del pool de conexiones
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_recycle=POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+)
+SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
 Base = declarative_base()
 
+# Dependencia de sesión: se cierra siempre, aunque el handler lance una excepción
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+# Filas que se envían por bloque al exportar una tabla completa
+TAMANO_BLOQUE = 500
+
+def columnas_de(modelo, fields: Optional[str]):
+    # Traduce "nombre,edad" a columnas del modelo; el id siempre se incluye
+    # porque es el cursor de la paginación
+    tabla = modelo.__table__.columns
+    if not fields:
+        return list(tabla)
+    nombres = [f.strip() for f in fields.split(",") if f.strip()]
+    invalidos = [n for n in nombres if n not in tabla]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos no válidos: {', '.join(invalidos)}")
+    return [tabla["id"]] + [tabla[n] for n in nombres if n != "id"]
+
+async def listar_pagina(db: AsyncSession, modelo, columnas, after_id: Optional[int], limit: int):
+    # Paginación por llave: WHERE id > after_id ORDER BY id LIMIT n.
+    # Se seleccionan solo las columnas pedidas, sin construir objetos ORM.
+    consulta = select(*columnas).order_by(modelo.id).limit(limit)
+    if after_id is not None:
+        consulta = consulta.where(modelo.id > after_id)
+    resultado = await db.execute(consulta)
+    return [dict(fila) for fila in resultado.mappings()]
+
+async def exportar_json(modelo, columnas):
+    # Arreglo JSON transmitido por bloques desde un cursor del servidor.
+    # Usa su propia conexión porque la sesión de get_db se cierra antes de
+    # terminar de enviar la respuesta.
+    async with engine.connect() as conn:
+        resultado = await conn.stream(select(*columnas).order_by(modelo.id))
+        yield "["
+        primero = True
+        async for bloque in resultado.mappings().partitions(TAMANO_BLOQUE):
+            partes = ",".join(json.dumps(dict(fila), ensure_ascii=False) for fila in bloque)
+            yield partes if primero else "," + partes
+            primero = False
+        yield "]"
+
+async def listar(db: AsyncSession, modelo, response: Response, after_id, limit, fields, stream):
+    columnas = columnas_de(modelo, fields)
+    if stream:
+        return StreamingResponse(exportar_json(modelo, columnas), media_type="application/json")
+    filas = await listar_pagina(db, modelo, columnas, after_id, limit)
+    # Si la página viene llena, el cliente pide la siguiente con este after_id
+    headers = {"X-Next-After-Id": str(filas[-1]["id"])} if len(filas) == limit else {}
+    if fields:
+        # Con proyección no aplica el response_model completo
+        return JSONResponse(content=filas, headers=headers)
+    response.headers.update(headers)
+    return filas
+
+# Escrituras en un solo viaje a la base: UPDATE/DELETE ... WHERE id y el
+# rowcount decide el 404. Como el PUT manda el registro completo, la
+# respuesta se arma con los datos recibidos y no hace falta otro SELECT.
+# synchronize_session=False evita que el ORM agregue consultas para
+# sincronizar objetos de la sesión (aquí no hay ninguno cargado).
+async def actualizar_por_id(db: AsyncSession, modelo, id: int, valores: dict) -> bool:
+    consulta = update(modelo).where(modelo.id == id).values(**valores)
+    resultado = await db.execute(consulta.execution_options(synchronize_session=False))
+    await db.commit()
+    return resultado.rowcount > 0
+
+async def eliminar_por_id(db: AsyncSession, modelo, id: int) -> bool:
+    consulta = delete(modelo).where(modelo.id == id)
+    resultado = await db.execute(consulta.execution_options(synchronize_session=False))
+    await db.commit()
+    return resultado.rowcount > 0
+
+async def actualizar_lote(db: AsyncSession, modelo, registros: List[dict]) -> int:
+    # Un solo executemany de UPDATE ... WHERE id = :b_id para todos los registros
+    if not registros:
+        return 0
+    tabla = modelo.__table__
+    campos = [c for c in registros[0] if c != "id"]
+    consulta = (
+        update(tabla)
+        .where(tabla.c.id == bindparam("b_id"))
+        .values({c: bindparam(f"b_{c}") for c in campos})
+    )
+    parametros = [{f"b_{k}": v for k, v in r.items()} for r in registros]
+    conn = await db.connection()
+    resultado = await conn.execute(consulta, parametros)
+    await db.commit()
+    return resultado.rowcount
+
+async def eliminar_lote(db: AsyncSession, modelo, ids: List[int]) -> int:
+    consulta = delete(modelo).where(modelo.id.in_(ids))
+    resultado = await db.execute(consulta.execution_options(synchronize_session=False))
+    await db.commit()
+    return resultado.rowcount
+
+async def insertar_lote(db: AsyncSession, modelo, registros: List[dict]) -> int:
+    # Un solo executemany de INSERT para todos los registros
+    if not registros:
+        return 0
+    conn = await db.connection()
+    await conn.execute(insert(modelo.__table__), registros)
+    await db.commit()
+    return len(registros)
+
+# Tamaño y vigencia (segundos) de la caché de GET /{id} de cada entidad
+CACHE_TAMANO = int(os.getenv("CACHE_TAMANO", "1000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+
+class CacheLectura:
+    # LRU con vencimiento para GET /{id}. Las escrituras de este proceso la
+    # invalidan; el TTL acota lo desactualizada que puede estar si otro
+    # proceso modifica la misma fila. La versión evita guardar una fila leída
+    # antes de una invalidación que ocurrió mientras se consultaba.
+    def __init__(self, tamano: int = CACHE_TAMANO, ttl: float = CACHE_TTL):
+        self.tamano = tamano
+        self.ttl = ttl
+        self.datos = OrderedDict()
+        self.version = 0
+
+    def obtener(self, id: int):
+        entrada = self.datos.get(id)
+        if entrada is None:
+            return None
+        vence, valor = entrada
+        if vence < time.monotonic():
+            del self.datos[id]
+            return None
+        self.datos.move_to_end(id)
+        return valor
+
+    def guardar(self, id: int, valor: dict, version: int):
+        if version != self.version:
+            return
+        self.datos[id] = (time.monotonic() + self.ttl, valor)
+        self.datos.move_to_end(id)
+        if len(self.datos) > self.tamano:
+            self.datos.popitem(last=False)
+
+    def invalidar(self, ids):
+        self.version += 1
+        for id in ids:
+            self.datos.pop(id, None)
+
+def crear_router_crud(modelo, schema, schema_out, schema_lote, prefijo: str, nombre: str) -> APIRouter:
+    """
+    Genera el CRUD completo de una tabla: alta individual y por lote,
+    listado paginado/proyectado/transmitido, GET /{id} con caché y
+    actualización/eliminación individual y por lote en un solo viaje.
+    """
+    router = APIRouter(prefix=prefijo)
+    plural = prefijo.strip("/")
+    no_encontrado = f"{nombre} no encontrado"
+    cache = CacheLectura()
+
+    @router.post("/", response_model=schema_out)
+    async def crear(datos: schema, db: AsyncSession = Depends(get_db)):
+        nuevo = modelo(**datos.dict())
+        db.add(nuevo)
+        await db.commit()
+        # expire_on_commit=False conserva el id generado sin otro SELECT
+        return nuevo
+
+    @router.post("/lote")
+    async def crear_lote(datos: List[schema], db: AsyncSession = Depends(get_db)):
+        insertados = await insertar_lote(db, modelo, [d.dict() for d in datos])
+        return {"mensaje": f"{insertados} {plural} registrados", "insertados": insertados}
+
+    @router.get("/", response_model=List[schema_out])
+    async def listar_todos(
+        response: Response,
+        after_id: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        fields: Optional[str] = None,
+        stream: bool = False,
+        db: AsyncSession = Depends(get_db),
+    ):
+        return await listar(db, modelo, response, after_id, limit, fields, stream)
+
+    @router.get("/{id}", response_model=schema_out)
+    async def obtener(id: int, db: AsyncSession = Depends(get_db)):
+        guardado = cache.obtener(id)
+        if guardado is not None:
+            return guardado
+        version = cache.version
+        resultado = await db.execute(select(*modelo.__table__.columns).where(modelo.id == id))
+        fila = resultado.mappings().first()
+        if not fila:
+            raise HTTPException(status_code=404, detail=no_encontrado)
+        valor = dict(fila)
+        cache.guardar(id, valor, version)
+        return valor
+
+    @router.put("/lote")
+    async def actualizar_todos(datos: List[schema_lote], db: AsyncSession = Depends(get_db)):
+        registros = [d.dict() for d in datos]
+        actualizados = await actualizar_lote(db, modelo, registros)
+        cache.invalidar(r["id"] for r in registros)
+        return {"mensaje": f"{actualizados} {plural} actualizados", "actualizados": actualizados}
+
+    @router.delete("/lote")
+    async def eliminar_todos(ids: List[int] = Query(...), db: AsyncSession = Depends(get_db)):
+        eliminados = await eliminar_lote(db, modelo, ids)
+        cache.invalidar(ids)
+        return {"mensaje": f"{eliminados} {plural} eliminados", "eliminados": eliminados}
+
+    @router.put("/{id}", response_model=schema_out)
+    async def actualizar(id: int, datos: schema, db: AsyncSession = Depends(get_db)):
+        valores = datos.dict()
+        encontrado = await actualizar_por_id(db, modelo, id, valores)
+        cache.invalidar([id])
+        if not encontrado:
+            raise HTTPException(status_code=404, detail=no_encontrado)
+        return {"id": id, **valores}
+
+    @router.delete("/{id}")
+    async def eliminar(id: int, db: AsyncSession = Depends(get_db)):
+        encontrado = await eliminar_por_id(db, modelo, id)
+        cache.invalidar([id])
+        if not encontrado:
+            raise HTTPException(status_code=404, detail=no_encontrado)
+        return {"mensaje": f"{nombre} eliminado"}
+
+    return router
+
 # Inicializar FastAPI
 app = FastAPI(title="API Escolar")
 
@@ -37,9 +282,6 @@ class Alumno(Base):
     edad = Column(Integer)
     carrera = Column(String(100))
 
-# Crear tabla si no existe
-Base.metadata.create_all(bind=engine)
-
 # Esquema Pydantic de Alumno
 class AlumnoSchema(BaseModel):
     nombre: str = Field(..., min_length=2)
@@ -51,58 +293,8 @@ class AlumnoOut(AlumnoSchema):
     class Config:
         orm_mode = True
 
-# CRUD de Alumnos
-@app.post("/alumnos/", response_model=AlumnoOut)
-def crear_alumno(datos: AlumnoSchema):
-    db = SessionLocal()
-    nuevo = Alumno(**datos.dict())
-    db.add(nuevo)
-    db.commit()
-    db.refresh(nuevo)
-    db.close()
-    return nuevo
-
-@app.get("/alumnos/", response_model=List[AlumnoOut])
-def listar_alumnos():
-    db = SessionLocal()
-    resultado = db.query(Alumno).all()
-    db.close()
-    return resultado
-
-@app.get("/alumnos/{id}", response_model=AlumnoOut)
-def obtener_alumno(id: int):
-    db = SessionLocal()
-    alumno = db.query(Alumno).filter(Alumno.id == id).first()
-    db.close()
-    if not alumno:
-        raise HTTPException(status_code=404, detail="Alumno no encontrado")
-    return alumno
-
-@app.put("/alumnos/{id}", response_model=AlumnoOut)
-def actualizar_alumno(id: int, datos: AlumnoSchema):
-    db = SessionLocal()
-    alumno = db.query(Alumno).filter(Alumno.id == id).first()
-    if not alumno:
-        db.close()
-        raise HTTPException(status_code=404, detail="Alumno no encontrado")
-    for key, value in datos.dict().items():
-        setattr(alumno, key, value)
-    db.commit()
-    db.refresh(alumno)
-    db.close()
-    return alumno
-
-@app.delete("/alumnos/{id}")
-def eliminar_alumno(id: int):
-    db = SessionLocal()
-    alumno = db.query(Alumno).filter(Alumno.id == id).first()
-    if not alumno:
-        db.close()
-        raise HTTPException(status_code=404, detail="Alumno no encontrado")
-    db.delete(alumno)
-    db.commit()
-    db.close()
-    return {"mensaje": "Alumno eliminado"}
+class AlumnoLote(AlumnoSchema):
+    id: int
 
 
 
@@ -114,8 +306,11 @@ class Maestro(Base):
     experiencia = Column(Integer)
     correo = Column(String(100))
 
-# Crear tabla si no existe
-Base.metadata.create_all(bind=engine)
+# Crear tablas si no existen
+@app.on_event("startup")
+async def crear_tablas():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 # Esquema Pydantic de Alumno
 class MaestroSchema(BaseModel):
@@ -128,55 +323,10 @@ class MaestroOut(MaestroSchema):
     id: int
     class Config:
         orm_mode = True
+
+class MaestroLote(MaestroSchema):
+    id: int
         
-@app.post("/maestros/", response_model=MaestroOut)
-def crear_maestros(datos: MaestroSchema):
-    db = SessionLocal()
-    nuevo = Maestro(**datos.dict())
-    db.add(nuevo)
-    db.commit()
-    db.refresh(nuevo)
-    db.close()
-    return nuevo
-
-@app.get("/maestros/", response_model=List[MaestroOut])
-def listar_maestros():
-    db = SessionLocal()
-    resultado = db.query(Maestro).all()
-    db.close()
-    return resultado
-
-@app.get("/maestros/{id}", response_model=MaestroOut)
-def obtener_Maestro(id: int):
-    db = SessionLocal()
-    maestro = db.query(Maestro).filter(Maestro.id == id).first()
-    db.close()
-    if not maestro:
-        raise HTTPException(status_code=404, detail="Maestro no encontrado")
-    return maestro
-
-@app.put("/maestros/{id}", response_model=MaestroOut)
-def actualizar_maestro(id: int, datos: MaestroSchema):
-    db = SessionLocal()
-    maestro = db.query(Maestro).filter(Maestro.id == id).first()
-    if not maestro:
-        db.close()
-        raise HTTPException(status_code=404, detail="Maestro no encontrado")
-    for key, value in datos.dict().items():
-        setattr(maestro, key, value)
-    db.commit()
-    db.refresh(maestro)
-    db.close()
-    return maestro
-
-@app.delete("/maestros/{id}")
-def eliminar_maestro(id: int):  
-    db = SessionLocal()
-    maestro = db.query(Maestro).filter(Maestro.id == id).first()
-    if not maestro:
-        db.close()
-        raise HTTPException(status_code=404, detail="Maestro no encontrado")
-    db.delete(maestro)
-    db.commit()
-    db.close()
-    return {"mensaje": "Maestro eliminado"}
\ No newline at end of file
+# CRUD de Alumnos y Maestros
+app.include_router(crear_router_crud(Alumno, AlumnoSchema, AlumnoOut, AlumnoLote, "/alumnos", "Alumno"))
+app.include_router(crear_router_crud(Maestro, MaestroSchema, MaestroOut, MaestroLote, "/maestros", "Maestro"))
@@ -1,24 +1,45 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Body, Depends, HTTPException, Query, Response
 from sqlalchemy import (
     create_engine,
+    inspect,
+    text,
     Column,
+    UniqueConstraint,
     Integer,
     String,
     TIMESTAMP,
     ForeignKey,
     DECIMAL,
+    Index,
+    and_,
     desc,
+    or_,
 )
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, relationship, Session
-from pydantic import BaseModel
-import hashlib  # Para encriptar con MD5
-import requests
+from pydantic import BaseModel, Field
+from typing import Optional
+import asyncio
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+import math
+import numpy as np
 from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+# Hash de contraseñas (PBKDF2 o scrypt, configurable con variables de entorno)
+from practica9_hash import hash_password, necesita_rehash, verificar_password
 
-# Conexión a la base de datos
-DATABASE_URL = "mysql+mysqlconnector://root@localhost/db_gmartin_dapps"
+# Conexión a la base de datos (se puede cambiar con DATABASE_URL, por ejemplo
+# sqlite:///./asistencia.db para pruebas locales)
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+mysqlconnector://root@localhost/db_gmartin_dapps")
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
@@ -41,7 +62,7 @@ class User(Base):
     username = Column(String(50), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     full_name = Column(String(100))
-    created_at = Column(TIMESTAMP, default=datetime.now(timezone.utc))
+    created_at = Column(TIMESTAMP, default=lambda: datetime.now(timezone.utc))
 
 class Attendance(Base):
     __tablename__ = "P9_attendance"
@@ -54,11 +75,56 @@ class Attendance(Base):
         DECIMAL(11, 8), nullable=False
     ) # DECIMAL con precisión 11 y 8 decimales
     address = Column(String(255))
-    registered_at = Column(TIMESTAMP, default=datetime.now(timezone.utc)) 
+    # La hora se toma en cada inserción (lambda), no una sola vez al importar el módulo
+    registered_at = Column(TIMESTAMP, default=lambda: datetime.now(timezone.utc))
+    # Geohash de las coordenadas; los prefijos comunes agrupan puntos cercanos
+    geohash = Column(String(12))
+    # Llave que genera el cliente móvil para que reenviar un registro no lo duplique
+    client_key = Column(String(64))
     user = relationship("User")
 
+    # Los mismos nombres que en modelo.sql
+    __table_args__ = (
+        # Índice compuesto para el historial: filtra por usuario y recorre por fecha
+        Index("idx_attendance_user_registered", "user_id", "registered_at"),
+        # Búsquedas por cercanía: prefijos de geohash
+        Index("idx_attendance_geohash", "geohash"),
+        UniqueConstraint("user_id", "client_key", name="uq_attendance_user_client_key"),
+    )
+
+# Caché persistente de geocodificación inversa. La llave son las coordenadas
+# redondeadas a GEO_PRECISION decimales y guardadas como enteros.
+class GeoCache(Base):
+    __tablename__ = "P9_geocache"
+    lat_key = Column(Integer, primary_key=True, autoincrement=False)
+    lon_key = Column(Integer, primary_key=True, autoincrement=False)
+    address = Column(String(255), nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False)
+
 Base.metadata.create_all(bind=engine)
 
+# Migración de una tabla P9_attendance creada antes de geohash y client_key:
+# create_all no agrega columnas ni índices a tablas existentes (es la parte de
+# "cambios posteriores" de modelo.sql)
+def migrar_esquema():
+    tabla = Attendance.__tablename__
+    columnas = {c["name"] for c in inspect(engine).get_columns(tabla)}
+    with engine.begin() as conn:
+        if "geohash" not in columnas:
+            conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN geohash VARCHAR(12)"))
+        if "client_key" not in columnas:
+            conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN client_key VARCHAR(64)"))
+    for indice in Attendance.__table__.indexes:
+        indice.create(bind=engine, checkfirst=True)
+    # La restricción única se crea como índice único (equivale a UNIQUE KEY en MySQL)
+    existentes = {i["name"] for i in inspect(engine).get_indexes(tabla)}
+    existentes |= {u["name"] for u in inspect(engine).get_unique_constraints(tabla)}
+    if "uq_attendance_user_client_key" not in existentes:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE UNIQUE INDEX uq_attendance_user_client_key ON {tabla} (user_id, client_key)"))
+
+migrar_esquema()
+
 # Modelos Pydantic para validación de datos
 class RegisterModel(BaseModel):
     username: str
@@ -73,6 +139,11 @@ class AttendanceModel(BaseModel):
     user_id: int
     latitude: float
     longitude: float
+
+# Registro capturado sin conexión y reenviado por /attendance/batch
+class AttendanceBatchItem(AttendanceModel):
+    client_key: str = Field(..., min_length=1, max_length=64)
+    registered_at: datetime
     
 # Modelo Pydantic para la respuesta del historial (necesario para serializar)
 class AttendanceResponse(BaseModel):
@@ -81,6 +152,20 @@ class AttendanceResponse(BaseModel):
     latitude: float
     longitude: float
 
+class AttendanceNearbyResponse(AttendanceResponse):
+    attendance_id: int
+    user_id: int
+    distance_m: float
+
+class PuntoModel(BaseModel):
+    latitude: float
+    longitude: float
+
+class ScoreModel(BaseModel):
+    sites: list[PuntoModel]
+    points: list[PuntoModel]
+    max_distance_m: float = 200.0
+
 # Dependencia DB
 def get_db():
     db = SessionLocal()
@@ -89,90 +174,711 @@ def get_db():
     finally:
         db.close()
 
-# Función para encriptar con MD5
-def md5_hash(password: str) -> str:
-    return hashlib.md5(password.encode()).hexdigest()
+# Procesos que calculan los hashes
+HASH_PROCESOS = int(os.getenv("HASH_PROCESOS", str(os.cpu_count() or 1)))
 
-# Endpoint: Registro de usuario
-@app.post("/register/")
-def register(data: RegisterModel, db=Depends(get_db)):
-    hashed_pw = md5_hash(data.password) # Encriptación con MD5
+# El hash consume CPU: se calcula en procesos aparte para no bloquear el event loop.
+# El pool se crea al arrancar y con 'spawn': hacer fork de un proceso que ya
+# tiene hilos (event loop y threadpool) puede dejar al hijo bloqueado, y los
+# procesos nuevos solo importan practica9_hash, no este módulo.
+_pool_hash = None
+
+@app.on_event("startup")
+async def iniciar_pool_hash():
+    global _pool_hash
+    _pool_hash = ProcessPoolExecutor(max_workers=HASH_PROCESOS, mp_context=multiprocessing.get_context("spawn"))
+
+async def en_pool_hash(funcion, *args):
+    if _pool_hash is None:
+        # Sin el evento de arranque (por ejemplo, en pruebas) se usa el threadpool
+        return await run_in_threadpool(funcion, *args)
+    return await asyncio.get_running_loop().run_in_executor(_pool_hash, funcion, *args)
+
+# Hash de una contraseña al azar con la configuración actual. Si el usuario no
+# existe se verifica contra él: la respuesta cuesta lo mismo que con un usuario
+# real y el tiempo no revela qué nombres de usuario están registrados
+_hash_ficticio = None
+
+async def hash_ficticio() -> str:
+    global _hash_ficticio
+    if _hash_ficticio is None:
+        _hash_ficticio = await en_pool_hash(hash_password, secrets.token_hex(16))
+    return _hash_ficticio
+
+@app.on_event("startup")
+async def iniciar_hash_ficticio():
+    # Se calcula al arrancar para que el primer login fallido no tarde el doble
+    await hash_ficticio()
+
+# Caché corta de usuarios para no consultar P9_users en cada login
+USUARIOS_CACHE_TTL = float(os.getenv("USUARIOS_CACHE_TTL", "30"))  # segundos
+USUARIOS_CACHE_TAMANO = int(os.getenv("USUARIOS_CACHE_TAMANO", "10000"))
+
+class CacheUsuarios:
+    def __init__(self, ttl=USUARIOS_CACHE_TTL, tamano=USUARIOS_CACHE_TAMANO):
+        self.ttl = ttl
+        self.tamano = tamano
+        self.datos = OrderedDict()
+
+    def obtener(self, username: str):
+        entrada = self.datos.get(username)
+        if entrada is None:
+            return None
+        vence, usuario = entrada
+        if vence < time.monotonic():
+            del self.datos[username]
+            return None
+        self.datos.move_to_end(username)
+        return usuario
+
+    def guardar(self, username: str, user_id: int, password_hash: str):
+        self.datos[username] = (time.monotonic() + self.ttl, (user_id, password_hash))
+        self.datos.move_to_end(username)
+        if len(self.datos) > self.tamano:
+            self.datos.popitem(last=False)
+
+usuarios_cache = CacheUsuarios()
+
+# ---------------------------------------------------------------------------
+# Geocodificación inversa con caché (memoria LRU + tabla P9_geocache)
+# ---------------------------------------------------------------------------
+
+DIRECCION_NO_DISPONIBLE = "Dirección no disponible"
+
+# 4 decimales ~ 11 m: registros desde el mismo edificio comparten dirección
+GEO_PRECISION = int(os.getenv("GEO_PRECISION", "4"))
+GEO_CACHE_TAMANO = int(os.getenv("GEO_CACHE_TAMANO", "10000"))
+GEO_CACHE_TTL = float(os.getenv("GEO_CACHE_TTL", str(30 * 24 * 3600)))  # segundos
+
+def formatear_direccion(result: dict) -> str:
+    # Intenta obtener una dirección detallada o el nombre de la vía
+    if 'address' in result and result['address']:
+        addr = result['address']
+        # Construye una dirección más específica, priorizando calle y número
+        street = addr.get('road')
+        house = addr.get('house_number')
+        city = addr.get('city') or addr.get('town') or addr.get('village')
+
+        if street and house:
+            return f"{street} #{house}, {city or 'Localidad desconocida'}"
+        elif street:
+            return f"{street}, {city or 'Localidad desconocida'}"
+    # Si no hay calle, usa la descripción general de Nominatim
+    return result.get("display_name", "Dirección general no disponible")
+
+# Límites del cliente HTTP hacia Nominatim
+GEO_TIMEOUT = float(os.getenv("GEO_TIMEOUT", "3"))  # segundos por petición
+GEO_CONCURRENCIA = int(os.getenv("GEO_CONCURRENCIA", "4"))  # peticiones simultáneas
+GEO_FALLOS_MAX = int(os.getenv("GEO_FALLOS_MAX", "5"))  # fallos seguidos para abrir el circuito
+GEO_ESPERA_CIRCUITO = float(os.getenv("GEO_ESPERA_CIRCUITO", "30"))  # segundos con el circuito abierto
+
+class CircuitoAbierto(Exception):
+    pass
+
+class Circuito:
+    """
+    Circuit breaker: tras GEO_FALLOS_MAX fallos seguidos deja de llamar al
+    servicio durante GEO_ESPERA_CIRCUITO segundos; después deja pasar una
+    sola petición de prueba y se cierra si esa funciona.
+    """
+    def __init__(self, fallos_max=GEO_FALLOS_MAX, espera=GEO_ESPERA_CIRCUITO):
+        self.fallos_max = fallos_max
+        self.espera = espera
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.probando = False
+
+    def permitir(self):
+        if self.fallos < self.fallos_max:
+            return
+        if time.monotonic() < self.abierto_hasta or self.probando:
+            raise CircuitoAbierto()
+        self.probando = True
+
+    def exito(self):
+        self.fallos = 0
+        self.probando = False
+
+    def fallo(self):
+        self.fallos += 1
+        self.probando = False
+        if self.fallos >= self.fallos_max:
+            self.abierto_hasta = time.monotonic() + self.espera
+
+class GeocodificadorNominatim:
+    # Cliente asíncrono con conexiones reutilizables (keep-alive), timeouts
+    # estrictos y un semáforo que limita las peticiones simultáneas
+    URL = "https://nominatim.openstreetmap.org/reverse"
+
+    def __init__(self, url=URL, timeout=GEO_TIMEOUT, concurrencia=GEO_CONCURRENCIA):
+        self.url = url
+        self.timeout = timeout
+        self.concurrencia = concurrencia
+        self.cliente = None
+        self.semaforo = None
+        self.circuito = Circuito()
+
+    def _abrir(self):
+        if self.cliente is None:
+            self.cliente = httpx.AsyncClient(
+                headers={"User-Agent": "FastAPIApp/1.0"}, # Cabecera requerida
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 2.0)),
+                limits=httpx.Limits(max_connections=self.concurrencia, max_keepalive_connections=self.concurrencia),
+            )
+            self.semaforo = asyncio.Semaphore(self.concurrencia)
+
+    async def cerrar(self):
+        if self.cliente is not None:
+            await self.cliente.aclose()
+            self.cliente = None
+
+    async def __call__(self, lat: float, lon: float) -> str:
+        try:
+            self.circuito.permitir()
+        except CircuitoAbierto:
+            return DIRECCION_NO_DISPONIBLE
+        self._abrir()
+        try:
+            async with self.semaforo:
+                response = await self.cliente.get(
+                    self.url, params={"format": "json", "lat": lat, "lon": lon}
+                )
+            if response.status_code != 200:
+                raise httpx.HTTPStatusError("Respuesta no válida", request=response.request, response=response)
+            address = formatear_direccion(response.json())
+        except (httpx.HTTPError, ValueError):
+            # Servicio lento, caído o con respuesta inválida
+            self.circuito.fallo()
+            return DIRECCION_NO_DISPONIBLE
+        except asyncio.CancelledError:
+            # Si se cancela la petición de prueba, otra podrá intentarlo
+            self.circuito.probando = False
+            raise
+        self.circuito.exito()
+        return address
+
+geocodificar_nominatim = GeocodificadorNominatim()
+
+class CacheGeocodificacion:
+    """
+    Resuelve direcciones buscando primero en un LRU en memoria con TTL, luego
+    en la tabla P9_geocache y al final en el geocodificador. El geocodificador
+    es intercambiable (por ejemplo, uno falso en pruebas sin red) y debe ser
+    una función asíncrona que reciba (lat, lon) y devuelva la dirección.
+    """
+    def __init__(self, geocodificador=geocodificar_nominatim, precision=GEO_PRECISION,
+                 tamano=GEO_CACHE_TAMANO, ttl=GEO_CACHE_TTL):
+        self.geocodificador = geocodificador
+        self.precision = precision
+        self.tamano = tamano
+        self.ttl = ttl
+        self.memoria = OrderedDict()
+        self.lock = threading.Lock()
+        self.metricas = {"hits_memoria": 0, "hits_bd": 0, "misses": 0}
+
+    def llave(self, lat: float, lon: float):
+        factor = 10 ** self.precision
+        return round(lat * factor), round(lon * factor)
+
+    def _contar(self, metrica: str):
+        with self.lock:
+            self.metricas[metrica] += 1
+
+    def _leer_memoria(self, llave):
+        with self.lock:
+            entrada = self.memoria.get(llave)
+            if entrada is None:
+                return None
+            vence, address = entrada
+            if vence < time.monotonic():
+                del self.memoria[llave]
+                return None
+            self.memoria.move_to_end(llave)
+            return address
+
+    def _guardar_memoria(self, llave, address: str, vence: float):
+        with self.lock:
+            self.memoria[llave] = (vence, address)
+            self.memoria.move_to_end(llave)
+            if len(self.memoria) > self.tamano:
+                self.memoria.popitem(last=False)
+
+    def _leer_bd(self, llave):
+        db = SessionLocal()
+        try:
+            fila = db.get(GeoCache, llave)
+            if fila is None:
+                return None
+            edad = (datetime.now(timezone.utc).replace(tzinfo=None) - fila.updated_at).total_seconds()
+            if edad > self.ttl:
+                return None
+            return fila.address, self.ttl - edad
+        finally:
+            db.close()
+
+    def _guardar_bd(self, llave, address: str):
+        db = SessionLocal()
+        try:
+            db.merge(GeoCache(
+                lat_key=llave[0],
+                lon_key=llave[1],
+                address=address,
+                updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            ))
+            db.commit()
+        except IntegrityError:
+            # Otra petición guardó la misma celda al mismo tiempo
+            db.rollback()
+        finally:
+            db.close()
+
+    async def buscar(self, llave):
+        # Busca solo en la caché (memoria y BD); devuelve None si no está
+        address = self._leer_memoria(llave)
+        if address is not None:
+            self._contar("hits_memoria")
+            return address
+
+        # Las consultas a la BD son síncronas: se hacen fuera del event loop
+        guardado = await run_in_threadpool(self._leer_bd, llave)
+        if guardado is not None:
+            address, restante = guardado
+            self._contar("hits_bd")
+            self._guardar_memoria(llave, address, time.monotonic() + restante)
+            return address
+        return None
+
+    async def geocodificar(self, llave) -> str:
+        self._contar("misses")
+        # Se geocodifica el centro de la celda para que la dirección guardada
+        # no dependa de cuál de las coordenadas cercanas llegó primero
+        factor = 10 ** self.precision
+        address = await self.geocodificador(llave[0] / factor, llave[1] / factor)
+        # Los fallos no se guardan, así se reintenta en la siguiente petición
+        if address != DIRECCION_NO_DISPONIBLE:
+            await run_in_threadpool(self._guardar_bd, llave, address)
+            self._guardar_memoria(llave, address, time.monotonic() + self.ttl)
+        return address
+
+    async def resolver(self, lat: float, lon: float) -> str:
+        llave = self.llave(lat, lon)
+        address = await self.buscar(llave)
+        if address is None:
+            address = await self.geocodificar(llave)
+        return address
+
+geocache = CacheGeocodificacion()
+
+async def resolver_direccion(lat: float, lon: float) -> str:
+    return await geocache.resolver(lat, lon)
+
+# ---------------------------------------------------------------------------
+# Índice espacial (geohash) y distancias
+# ---------------------------------------------------------------------------
+
+GEOHASH_PRECISION = 9  # ~4.8 m x 4.8 m, suficiente para cualquier radio de búsqueda
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+RADIO_TIERRA_M = 6371008.8
+METROS_POR_GRADO = 111320.0
+
+def geohash_codificar(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_rango = [-90.0, 90.0]
+    lon_rango = [-180.0, 180.0]
+    resultado = []
+    bits = 0
+    valor = 0
+    es_lon = True
+    while len(resultado) < precision:
+        rango, coord = (lon_rango, lon) if es_lon else (lat_rango, lat)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coord >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        es_lon = not es_lon
+        bits += 1
+        if bits == 5:
+            resultado.append(GEOHASH_BASE32[valor])
+            bits = 0
+            valor = 0
+    return "".join(resultado)
+
+def geohash_celda(precision: int):
+    # Alto y ancho en grados de una celda de geohash de esta precisión
+    bits = 5 * precision
+    lat_bits = bits // 2
+    lon_bits = bits - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def geohash_cubrir(lat: float, lon: float, radio_m: float):
+    """
+    Celdas de geohash (la central y sus 8 vecinas) que cubren un círculo de
+    radio_m alrededor del punto. Se usa la precisión más fina cuya celda sea
+    al menos tan grande como el radio.
+    """
+    precision = 1
+    for p in range(GEOHASH_PRECISION, 0, -1):
+        alto, ancho = geohash_celda(p)
+        alto_m = alto * METROS_POR_GRADO
+        ancho_m = ancho * METROS_POR_GRADO * max(math.cos(math.radians(lat)), 1e-6)
+        if min(alto_m, ancho_m) >= radio_m:
+            precision = p
+            break
+    alto, ancho = geohash_celda(precision)
+    celdas = set()
+    for dlat in (-alto, 0.0, alto):
+        for dlon in (-ancho, 0.0, ancho):
+            vecino_lat = min(max(lat + dlat, -90.0), 90.0)
+            vecino_lon = (lon + dlon + 180.0) % 360.0 - 180.0
+            celdas.add(geohash_codificar(vecino_lat, vecino_lon, precision))
+    return sorted(celdas)
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    # Distancia en metros entre arreglos de puntos (admite broadcasting)
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+# Puntos que se comparan contra todos los sitios en cada bloque de /attendance/score
+SCORE_BLOQUE = 10000
+
+def distancia_a_sitios(sitios: np.ndarray, puntos: np.ndarray):
+    """
+    Para cada punto (N, 2) devuelve el índice del sitio (M, 2) más cercano y su
+    distancia en metros. Se procesa por bloques para que la matriz N x M no
+    crezca sin límite.
+    """
+    cercano = np.empty(len(puntos), dtype=np.int64)
+    distancia = np.empty(len(puntos), dtype=float)
+    for inicio in range(0, len(puntos), SCORE_BLOQUE):
+        bloque = puntos[inicio:inicio + SCORE_BLOQUE]
+        d = haversine_np(bloque[:, None, 0], bloque[:, None, 1], sitios[None, :, 0], sitios[None, :, 1])
+        cercano[inicio:inicio + len(bloque)] = d.argmin(axis=1)
+        distancia[inicio:inicio + len(bloque)] = d.min(axis=1)
+    return cercano, distancia
+
+def rellenar_geohash(lote: int = 1000):
+    # Completa el geohash de registros creados antes de existir la columna
+    while True:
+        db = SessionLocal()
+        try:
+            filas = (
+                db.query(Attendance.attendance_id, Attendance.latitude, Attendance.longitude)
+                .filter(Attendance.geohash.is_(None))
+                .limit(lote)
+                .all()
+            )
+            if not filas:
+                return
+            db.bulk_update_mappings(Attendance, [
+                {"attendance_id": f.attendance_id, "geohash": geohash_codificar(float(f.latitude), float(f.longitude))}
+                for f in filas
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+tareas_fondo = set()
+
+@app.on_event("startup")
+async def iniciar_relleno_geohash():
+    # Corre en segundo plano para no retrasar el arranque con tablas grandes
+    tarea = asyncio.create_task(run_in_threadpool(rellenar_geohash))
+    tareas_fondo.add(tarea)
+    tarea.add_done_callback(tareas_fondo.discard)
+
+# ---------------------------------------------------------------------------
+# Resolución diferida de direcciones
+# ---------------------------------------------------------------------------
+
+DIRECCION_PENDIENTE = "Dirección pendiente"
+
+# Con GEO_DIFERIDO=1 /attendance/ guarda el registro sin esperar la dirección
+GEO_DIFERIDO = os.getenv("GEO_DIFERIDO", "0") == "1"
+GEO_LOTE = int(os.getenv("GEO_LOTE", "50"))  # registros por lote del worker
+GEO_INTERVALO = float(os.getenv("GEO_INTERVALO", "1"))  # política de Nominatim: 1 petición por segundo
+GEO_COLA_MAX = int(os.getenv("GEO_COLA_MAX", "10000"))
+GEO_BARRIDO = float(os.getenv("GEO_BARRIDO", "60"))  # segundos ociosos antes de buscar pendientes en BD
+
+class ResolutorDirecciones:
+    """
+    Worker en segundo plano que completa la dirección de los registros
+    guardados como pendientes. Toma lotes de la cola, agrupa las coordenadas
+    que caen en la misma celda de la caché, respeta el intervalo mínimo entre
+    llamadas al proveedor y actualiza P9_attendance con un UPDATE por celda.
+    """
+    def __init__(self, lote=GEO_LOTE, intervalo=GEO_INTERVALO, cola_max=GEO_COLA_MAX, barrido=GEO_BARRIDO):
+        self.lote = lote
+        self.intervalo = intervalo
+        self.cola_max = cola_max
+        self.barrido = barrido
+        self.cola = None
+        self.tarea = None
+        self.ultima_llamada = 0.0
+        # Serializa el turno de llamadas al proveedor entre el worker y las
+        # peticiones que resuelven en línea (resolver_celdas)
+        self.turno = asyncio.Lock()
+        # Último attendance_id revisado por el barrido; así cada barrido avanza
+        # y los registros que no se pudieron resolver no bloquean a los demás
+        self.cursor_barrido = 0
+
+    def iniciar(self):
+        self.cola = asyncio.Queue(maxsize=self.cola_max)
+        self.tarea = asyncio.create_task(self._ejecutar())
+
+    async def detener(self):
+        if self.tarea is not None:
+            self.tarea.cancel()
+            try:
+                await self.tarea
+            except asyncio.CancelledError:
+                pass
+            self.tarea = None
+
+    def encolar(self, attendance_id: int, lat: float, lon: float) -> bool:
+        # Si la cola está llena (o el worker no arrancó) el registro queda
+        # pendiente en la BD y lo recoge el siguiente barrido
+        if self.cola is None:
+            return False
+        try:
+            self.cola.put_nowait((attendance_id, lat, lon))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _pendientes_bd(self, despues_de: int, limite: int):
+        db = SessionLocal()
+        try:
+            return (
+                db.query(Attendance.attendance_id, Attendance.latitude, Attendance.longitude)
+                .filter(Attendance.address == DIRECCION_PENDIENTE, Attendance.attendance_id > despues_de)
+                .order_by(Attendance.attendance_id)
+                .limit(limite)
+                .all()
+            )
+        finally:
+            db.close()
+
+    def _actualizar_bd(self, ids, address: str):
+        db = SessionLocal()
+        try:
+            (
+                db.query(Attendance)
+                .filter(Attendance.attendance_id.in_(ids), Attendance.address == DIRECCION_PENDIENTE)
+                .update({Attendance.address: address}, synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _siguiente_lote(self):
+        try:
+            primero = await asyncio.wait_for(self.cola.get(), timeout=self.barrido)
+        except asyncio.TimeoutError:
+            # Cola ociosa: se recuperan los pendientes que no llegaron a la cola
+            # (reinicios, cola llena, fallos del proveedor u otros procesos)
+            filas = await run_in_threadpool(self._pendientes_bd, self.cursor_barrido, self.lote)
+            # Al llegar al final de la tabla el siguiente barrido empieza de nuevo
+            self.cursor_barrido = filas[-1].attendance_id if filas else 0
+            return [(f.attendance_id, float(f.latitude), float(f.longitude)) for f in filas]
+        lote = [primero]
+        while len(lote) < self.lote and not self.cola.empty():
+            lote.append(self.cola.get_nowait())
+        return lote
+
+    async def _resolver_celda(self, llave, lat: float, lon: float) -> str:
+        address = await geocache.buscar(llave)
+        if address is not None:
+            return address
+        async with self.turno:
+            espera = self.ultima_llamada + self.intervalo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            self.ultima_llamada = time.monotonic()
+        return await geocache.geocodificar(llave)
+
+    async def resolver_celdas(self, coordenadas):
+        """
+        Resuelve en línea muchas coordenadas: las que caen en la misma celda de
+        la caché se geocodifican una sola vez y las llamadas al proveedor
+        respetan el mismo intervalo que el worker. Devuelve {llave: dirección}.
+        """
+        unicas = {}
+        for lat, lon in coordenadas:
+            unicas.setdefault(geocache.llave(lat, lon), (lat, lon))
+        return {llave: await self._resolver_celda(llave, lat, lon) for llave, (lat, lon) in unicas.items()}
+
+    async def procesar_lote(self, lote):
+        # Agrupa los registros por celda: cada celda se resuelve una vez
+        celdas = {}
+        for attendance_id, lat, lon in lote:
+            celdas.setdefault(geocache.llave(lat, lon), (lat, lon, []))[2].append(attendance_id)
+        for llave, (lat, lon, ids) in celdas.items():
+            try:
+                address = await self._resolver_celda(llave, lat, lon)
+                # Proveedor caído o circuito abierto: los registros siguen
+                # pendientes y se reintentan en un barrido posterior
+                if address == DIRECCION_NO_DISPONIBLE:
+                    continue
+                await run_in_threadpool(self._actualizar_bd, ids, address)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Un error de BD no debe detener el worker; los registros
+                # siguen pendientes y se reintentan en el próximo barrido
+                pass
+
+    async def _ejecutar(self):
+        while True:
+            await self.procesar_lote(await self._siguiente_lote())
+
+resolutor = ResolutorDirecciones()
+
+@app.on_event("startup")
+async def iniciar_resolutor():
+    resolutor.iniciar()
+
+@app.on_event("shutdown")
+async def cerrar_geocodificador():
+    await resolutor.detener()
+    await geocodificar_nominatim.cerrar()
+    if _pool_hash is not None:
+        _pool_hash.shutdown(wait=False)
+
+def guardar_usuario(db: Session, data: RegisterModel, hashed_pw: str) -> int:
     user = User(
         username=data.username, password_hash=hashed_pw, full_name=data.full_name
     )
     db.add(user)
     db.commit()
     db.refresh(user)
-    return {"msg": "Usuario registrado", "user_id": user.user_id}
+    return user.user_id
+
+def buscar_usuario(db: Session, username: str):
+    return (
+        db.query(User.user_id, User.password_hash)
+        .filter(User.username == username)
+        .first()
+    )
+
+def actualizar_hash(db: Session, user_id: int, hashed_pw: str):
+    db.query(User).filter(User.user_id == user_id).update(
+        {User.password_hash: hashed_pw}, synchronize_session=False
+    )
+    db.commit()
+
+# Endpoint: Registro de usuario
+@app.post("/register/")
+async def register(data: RegisterModel, db=Depends(get_db)):
+    hashed_pw = await en_pool_hash(hash_password, data.password)
+    user_id = await run_in_threadpool(guardar_usuario, db, data, hashed_pw)
+    return {"msg": "Usuario registrado", "user_id": user_id}
 
 # Endpoint: Login
 @app.post("/login/")
-def login(data: LoginModel, db=Depends(get_db)):
-    user = db.query(User).filter(User.username == data.username).first()
-    if not user or user.password_hash != md5_hash(data.password):
+async def login(data: LoginModel, db=Depends(get_db)):
+    usuario = usuarios_cache.obtener(data.username)
+    if usuario is None:
+        fila = await run_in_threadpool(buscar_usuario, db, data.username)
+        if fila is not None:
+            usuario = (fila.user_id, fila.password_hash)
+            usuarios_cache.guardar(data.username, *usuario)
+    if usuario is None:
+        # Mismo trabajo que con un usuario existente (ver hash_ficticio)
+        await en_pool_hash(verificar_password, data.password, await hash_ficticio())
+        raise HTTPException(status_code=400, detail="Credenciales inválidas")
+    if not await en_pool_hash(verificar_password, data.password, usuario[1]):
         raise HTTPException(status_code=400, detail="Credenciales inválidas")
-    return {"msg": "Login exitoso", "user_id": user.user_id}
+
+    user_id, password_hash = usuario
+    # MD5 heredado o costo desactualizado: se guarda el hash con la configuración actual
+    if necesita_rehash(password_hash):
+        nuevo_hash = await en_pool_hash(hash_password, data.password)
+        await run_in_threadpool(actualizar_hash, db, user_id, nuevo_hash)
+        usuarios_cache.guardar(data.username, user_id, nuevo_hash)
+    return {"msg": "Login exitoso", "user_id": user_id}
 
 # --- CORRECCIÓN 1: Endpoint de Historial (Filtrado y formato de hora) ---
 @app.get("/attendance/history", response_model=list[AttendanceResponse])
 def get_attendance_history(
+    response: Response,
     user_id: int = Query(..., description="ID del usuario para filtrar el historial"), 
+    since: Optional[datetime] = Query(None, description="Solo registros desde esta fecha (inclusive)"),
+    until: Optional[datetime] = Query(None, description="Solo registros antes de esta fecha"),
+    before: Optional[datetime] = Query(None, description="Cursor: fecha del último registro de la página anterior"),
+    before_id: Optional[int] = Query(None, description="Cursor: attendance_id del último registro de la página anterior"),
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
     # Filtra por user_id, asegurando que solo se obtengan los registros del usuario logueado
+    query = db.query(Attendance).filter(Attendance.user_id == user_id)
+    if since is not None:
+        query = query.filter(Attendance.registered_at >= since)
+    if until is not None:
+        query = query.filter(Attendance.registered_at < until)
+    # Paginación por llave (registered_at, attendance_id): usa el índice
+    # compuesto y no tiene que saltar filas como OFFSET
+    if before is not None:
+        if before_id is not None:
+            # La condición redundante registered_at <= before deja que el índice
+            # empiece en el cursor; el OR solo no acota el rango del índice
+            query = query.filter(Attendance.registered_at <= before, or_(
+                Attendance.registered_at < before,
+                and_(Attendance.registered_at == before, Attendance.attendance_id < before_id),
+            ))
+        else:
+            query = query.filter(Attendance.registered_at < before)
     records = (
-        db.query(Attendance)
-        .filter(Attendance.user_id == user_id)
-        .order_by(desc(Attendance.registered_at))
+        query
+        .order_by(desc(Attendance.registered_at), desc(Attendance.attendance_id))
+        .limit(limit)
         .all()
     )
+
+    # Si la página viene llena, el cliente pide la siguiente con estos valores
+    if len(records) == limit:
+        response.headers["X-Next-Before"] = records[-1].registered_at.isoformat()
+        response.headers["X-Next-Before-Id"] = str(records[-1].attendance_id)
     
     # La respuesta incluye 'registered_at' como objeto datetime, lo cual es serializado a ISO 8601 por FastAPI.
     return records
 # --------------------------------------------------------------------------
 
 # --- CORRECCIÓN 2: Endpoint de Registro (Mejora en la obtención de la dirección) ---
+def guardar_asistencia(db: Session, data: AttendanceModel, address: str) -> Attendance:
+    record = Attendance(
+        user_id=data.user_id,
+        latitude=data.latitude,
+        longitude=data.longitude,
+        address=address,
+        geohash=geohash_codificar(data.latitude, data.longitude),
+    )
+    db.add(record)
+    db.commit()
+    db.refresh(record)
+    return record
+
 @app.post("/attendance/")
-def attendance(data: AttendanceModel, db=Depends(get_db)):
+async def attendance(
+    data: AttendanceModel,
+    diferido: bool = Query(GEO_DIFERIDO, description="Guardar sin esperar la dirección; se completa en segundo plano"),
+    db=Depends(get_db),
+):
     try:
-        # Consumir API pública de Nominatim con cabecera obligatoria
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={data.latitude}&lon={data.longitude}"
-        headers = {"User-Agent": "FastAPIApp/1.0"} # Cabecera requerida
-        response = requests.get(url, headers=headers)
-
-        address = "Dirección no disponible"
-
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Intenta obtener una dirección detallada o el nombre de la vía
-            if 'address' in result and result['address']:
-                addr = result['address']
-                # Construye una dirección más específica, priorizando calle y número
-                street = addr.get('road')
-                house = addr.get('house_number')
-                city = addr.get('city') or addr.get('town') or addr.get('village')
-
-                if street and house:
-                    address = f"{street} #{house}, {city or 'Localidad desconocida'}"
-                elif street:
-                    address = f"{street}, {city or 'Localidad desconocida'}"
-                else:
-                    # Si no hay calle, usa la descripción general de Nominatim
-                    address = result.get("display_name", "Dirección general no disponible")
-            else:
-                 address = result.get("display_name", "Dirección general no disponible")
+        if diferido:
+            # Se guarda de inmediato y el worker completa la dirección después
+            address = DIRECCION_PENDIENTE
+        else:
+            # La geocodificación no bloquea el event loop ni un hilo del threadpool;
+            # si el servicio falla se usa "Dirección no disponible"
+            address = await resolver_direccion(data.latitude, data.longitude)
 
         # Guardar registro en BD
-        record = Attendance(
-            user_id=data.user_id,
-            latitude=data.latitude,
-            longitude=data.longitude,
-            address=address,
-        )
-        db.add(record)
-        db.commit()
-        db.refresh(record)
+        record = await run_in_threadpool(guardar_asistencia, db, data, address)
+        if diferido:
+            resolutor.encolar(record.attendance_id, data.latitude, data.longitude)
         return {
             "msg": "Registro guardado",
             "attendance_id": record.attendance_id,
@@ -182,4 +888,183 @@ def attendance(data: AttendanceModel, db=Depends(get_db)):
 
     except Exception as e:
         # Se lanza un 500 para errores internos (DB, Nominatim, etc.)
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+# Máximo de registros aceptados por petición en /attendance/batch
+ATTENDANCE_LOTE_MAX = int(os.getenv("ATTENDANCE_LOTE_MAX", "500"))
+
+def filtrar_lote_asistencia(db: Session, items):
+    # Dos consultas para todo el lote: usuarios existentes y llaves ya guardadas
+    user_ids = {i.user_id for i in items}
+    existentes_usuarios = {
+        u for (u,) in db.query(User.user_id).filter(User.user_id.in_(user_ids))
+    }
+    guardadas = set(
+        db.query(Attendance.user_id, Attendance.client_key)
+        .filter(Attendance.client_key.in_({i.client_key for i in items}))
+        .all()
+    )
+    nuevos, duplicados, errores = [], [], []
+    vistos = set()
+    for item in items:
+        llave = (item.user_id, item.client_key)
+        if item.user_id not in existentes_usuarios:
+            errores.append({"client_key": item.client_key, "detail": "Usuario no encontrado"})
+        elif llave in guardadas or llave in vistos:
+            duplicados.append(item.client_key)
+        else:
+            vistos.add(llave)
+            nuevos.append(item)
+    return nuevos, duplicados, errores
+
+def guardar_lote_asistencia(db: Session, items, direcciones):
+    # Todos los registros nuevos se insertan en una sola transacción
+    records = [
+        Attendance(
+            user_id=item.user_id,
+            latitude=item.latitude,
+            longitude=item.longitude,
+            address=direcciones[(item.user_id, item.client_key)],
+            registered_at=item.registered_at,
+            geohash=geohash_codificar(item.latitude, item.longitude),
+            client_key=item.client_key,
+        )
+        for item in items
+    ]
+    try:
+        db.add_all(records)
+        db.flush()
+        # Se leen los datos antes del commit para no recargar cada fila después
+        guardados = [
+            {
+                "client_key": r.client_key,
+                "attendance_id": r.attendance_id,
+                "address": r.address,
+                "latitude": float(r.latitude),
+                "longitude": float(r.longitude),
+            }
+            for r in records
+        ]
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise
+    return guardados
+
+# Endpoint: Sincronización de registros hechos sin conexión
+@app.post("/attendance/batch")
+async def attendance_batch(
+    items: list[AttendanceBatchItem] = Body(...),
+    # Diferido por defecto: con diferido=false cada celda nueva espera su turno
+    # de GEO_INTERVALO, así que un lote grande puede tardar minutos
+    diferido: bool = Query(True, description="Guardar sin esperar las direcciones; se completan en segundo plano"),
+    db=Depends(get_db),
+):
+    if len(items) > ATTENDANCE_LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {ATTENDANCE_LOTE_MAX} registros por lote")
+    try:
+        nuevos, duplicados, errores = await run_in_threadpool(filtrar_lote_asistencia, db, items)
+
+        # Las direcciones se resuelven juntas, una vez por celda de la caché
+        if diferido:
+            direcciones = {(i.user_id, i.client_key): DIRECCION_PENDIENTE for i in nuevos}
+        else:
+            # Mismo limitador que el worker: no se salta la política de 1 petición por segundo
+            por_celda = await resolutor.resolver_celdas((i.latitude, i.longitude) for i in nuevos)
+            direcciones = {
+                (i.user_id, i.client_key): por_celda[geocache.llave(i.latitude, i.longitude)]
+                for i in nuevos
+            }
+
+        try:
+            records = await run_in_threadpool(guardar_lote_asistencia, db, nuevos, direcciones)
+        except IntegrityError:
+            # Otra petición guardó alguna de las mismas llaves mientras se
+            # geocodificaba: se vuelve a filtrar y se reintenta una vez
+            nuevos, mas_duplicados, _ = await run_in_threadpool(filtrar_lote_asistencia, db, nuevos)
+            duplicados.extend(mas_duplicados)
+            records = await run_in_threadpool(guardar_lote_asistencia, db, nuevos, direcciones)
+
+        if diferido:
+            for r in records:
+                resolutor.encolar(r["attendance_id"], r["latitude"], r["longitude"])
+        return {
+            "msg": f"{len(records)} registros guardados",
+            "saved": [
+                {"client_key": r["client_key"], "attendance_id": r["attendance_id"], "address": r["address"]}
+                for r in records
+            ],
+            "duplicates": duplicados,
+            "errors": errores,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Se lanza un 500 para errores internos (DB, Nominatim, etc.)
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+# Endpoint: Métricas de la caché de geocodificación
+@app.get("/geocache/metrics")
+def geocache_metrics():
+    metricas = dict(geocache.metricas)
+    total = sum(metricas.values())
+    metricas["entradas_memoria"] = len(geocache.memoria)
+    metricas["cola_pendientes"] = resolutor.cola.qsize() if resolutor.cola is not None else 0
+    metricas["tasa_aciertos"] = (metricas["hits_memoria"] + metricas["hits_bd"]) / total if total else 0.0
+    return metricas
+
+# Endpoint: Registros cercanos a un punto (por ejemplo, "quién llegó a 200 m del sitio X hoy")
+@app.get("/attendance/nearby", response_model=list[AttendanceNearbyResponse])
+def attendance_nearby(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(200.0, gt=0, le=50000),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+):
+    # 1. Poda con el índice: solo registros cuyas celdas de geohash tocan el círculo
+    celdas = geohash_cubrir(latitude, longitude, radius_m)
+    query = db.query(Attendance).filter(or_(*[Attendance.geohash.like(f"{c}%") for c in celdas]))
+    if since is not None:
+        query = query.filter(Attendance.registered_at >= since)
+    if until is not None:
+        query = query.filter(Attendance.registered_at < until)
+    candidatos = query.all()
+    if not candidatos:
+        return []
+
+    # 2. Filtro exacto con haversine, vectorizado sobre todos los candidatos
+    lats = np.array([float(r.latitude) for r in candidatos])
+    lons = np.array([float(r.longitude) for r in candidatos])
+    distancias = haversine_np(latitude, longitude, lats, lons)
+    orden = np.argsort(distancias)
+    resultado = []
+    for i in orden[:limit]:
+        if distancias[i] > radius_m:
+            break
+        r = candidatos[i]
+        resultado.append({
+            "attendance_id": r.attendance_id,
+            "user_id": r.user_id,
+            "registered_at": r.registered_at,
+            "address": r.address,
+            "latitude": r.latitude,
+            "longitude": r.longitude,
+            "distance_m": float(distancias[i]),
+        })
+    return resultado
+
+# Endpoint: Distancia de muchos puntos a los sitios conocidos (modo masivo con NumPy)
+@app.post("/attendance/score")
+def attendance_score(data: ScoreModel):
+    if not data.sites:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un sitio")
+    sitios = np.array([(p.latitude, p.longitude) for p in data.sites], dtype=float)
+    puntos = np.array([(p.latitude, p.longitude) for p in data.points], dtype=float).reshape(-1, 2)
+    cercano, distancia = distancia_a_sitios(sitios, puntos)
+    return [
+        {"nearest_site": int(i), "distance_m": float(d), "far": bool(d > data.max_distance_m)}
+        for i, d in zip(cercano, distancia)
+    ]
@@ -0,0 +1,60 @@
+# Hash de contraseñas de practica9.py.
+# Vive en un módulo aparte, sin conexión a la base de datos, porque los
+# procesos del pool de hash lo importan: importar practica9 en cada proceso
+# crearía el engine y las tablas otra vez.
+import hashlib  # Para encriptar con MD5 (hashes heredados), PBKDF2 y scrypt
+import hmac
+import os
+import secrets
+
+# Función para encriptar con MD5 (solo para verificar hashes heredados)
+def md5_hash(password: str) -> str:
+    return hashlib.md5(password.encode()).hexdigest()
+
+# ---------------------------------------------------------------------------
+# Hash de contraseñas configurable (PBKDF2 o scrypt de la biblioteca estándar)
+# ---------------------------------------------------------------------------
+
+# Algoritmo y costo para los hashes nuevos; subir el costo da más seguridad
+# y menos logins por segundo. Los hashes viejos se rehacen al iniciar sesión.
+PASSWORD_ALGORITMO = os.getenv("PASSWORD_ALGORITMO", "pbkdf2_sha256")  # o "scrypt"
+PBKDF2_ITERACIONES = int(os.getenv("PBKDF2_ITERACIONES", "600000"))
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+
+def _pbkdf2(password: str, salt: bytes, iteraciones: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iteraciones)
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * p + 1024 * 1024)
+
+def hash_password(password: str) -> str:
+    # Formatos: pbkdf2_sha256$iteraciones$sal$hash y scrypt$n$r$p$sal$hash (hex)
+    salt = secrets.token_bytes(16)
+    if PASSWORD_ALGORITMO == "scrypt":
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+    digest = _pbkdf2(password, salt, PBKDF2_ITERACIONES)
+    return f"pbkdf2_sha256${PBKDF2_ITERACIONES}${salt.hex()}${digest.hex()}"
+
+def verificar_password(password: str, almacenado: str) -> bool:
+    partes = almacenado.split("$")
+    if partes[0] == "pbkdf2_sha256" and len(partes) == 4:
+        esperado = bytes.fromhex(partes[3])
+        calculado = _pbkdf2(password, bytes.fromhex(partes[2]), int(partes[1]))
+    elif partes[0] == "scrypt" and len(partes) == 6:
+        n, r, p = int(partes[1]), int(partes[2]), int(partes[3])
+        esperado = bytes.fromhex(partes[5])
+        calculado = _scrypt(password, bytes.fromhex(partes[4]), n, r, p)
+    else:
+        # Hash MD5 heredado (32 caracteres hex sin prefijo)
+        return hmac.compare_digest(almacenado, md5_hash(password))
+    return hmac.compare_digest(esperado, calculado)
+
+def necesita_rehash(almacenado: str) -> bool:
+    # Verdadero para MD5 o si el algoritmo/costo configurado cambió
+    partes = almacenado.split("$")
+    if PASSWORD_ALGORITMO == "scrypt":
+        return partes[0] != "scrypt" or partes[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+    return partes[0] != "pbkdf2_sha256" or partes[1] != str(PBKDF2_ITERACIONES)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import lulu
+
+
+@pytest.fixture
+def conjuntos():
+    # Tres conjuntos de distinto tamaño rellenos con NaN hasta m columnas
+    rng = np.random.default_rng(7)
+    longitudes = np.array([50, 13, 37])
+    m = longitudes.max()
+    X = np.full((3, m), np.nan)
+    Y = np.full((3, m), np.nan)
+    for fila, (n, w, b) in enumerate(zip(longitudes, [2.0, -1.0, 0.5], [1.0, 3.0, -2.0])):
+        X[fila, :n] = rng.uniform(-2, 2, n)
+        Y[fila, :n] = w * X[fila, :n] + b + rng.normal(0, 0.1, n)
+    mascara = np.arange(m) < longitudes[:, None]
+    return X, Y, mascara, longitudes
+
+
+def por_separado(X, Y, longitudes):
+    # Referencia: cada conjunto ajustado solo con sus puntos, sin relleno
+    return [lulu.ajuste_cerrado(X[fila, :n], Y[fila, :n]) for fila, n in enumerate(longitudes)]
+
+
+def test_ajuste_cerrado_con_mascara_ignora_relleno(conjuntos):
+    X, Y, mascara, longitudes = conjuntos
+    # Bloques pequeños: el relleno cae en bloques parciales y en bloques vacíos para una fila
+    w, b, perdida = lulu.ajuste_cerrado(X, Y, bloque=8, mascara=mascara)
+    for fila, (we, be, pe) in enumerate(por_separado(X, Y, longitudes)):
+        assert w[fila] == pytest.approx(we[0])
+        assert b[fila] == pytest.approx(be[0])
+        assert perdida[fila] == pytest.approx(pe[0])
+
+
+def test_longitudes_equivalen_a_la_mascara(conjuntos):
+    X, Y, mascara, longitudes = conjuntos
+    con_mascara = lulu.estadisticas_lote(X, Y, bloque=8, mascara=mascara)
+    con_longitudes = lulu.estadisticas_lote(X, Y, bloque=8, longitudes=longitudes)
+    for a, b in zip(con_mascara, con_longitudes):
+        np.testing.assert_allclose(a, b)
+    assert list(con_mascara[0]) == list(longitudes)
+
+
+def test_descensos_con_mascara_llegan_al_ajuste_cerrado(conjuntos):
+    X, Y, mascara, longitudes = conjuntos
+    w, b, _ = lulu.ajuste_cerrado(X, Y, mascara=mascara)
+    wg, bg, _, _ = lulu.descenso_gradiente(X, Y, lr=0.1, pasos=5000, tol=1e-14, bloque=8, longitudes=longitudes)
+    np.testing.assert_allclose(wg, w, atol=1e-5)
+    np.testing.assert_allclose(bg, b, atol=1e-5)
+    # Mini-lotes de 8: es estocástico por bloques, se acerca pero no llega exacto
+    wm, bm, perdida, _ = lulu.descenso_minilotes(X, Y, lr=0.05, epocas=500, tam_lote=8, mascara=mascara)
+    np.testing.assert_allclose(wm, w, atol=0.05)
+    np.testing.assert_allclose(bm, b, atol=0.05)
+    assert np.isfinite(perdida).all()
+
+
+def test_conjunto_sin_puntos(conjuntos):
+    X, Y, mascara, longitudes = conjuntos
+    mascara[1] = False
+    w, b, perdida = lulu.ajuste_cerrado(X, Y, bloque=8, mascara=mascara)
+    assert (w[1], b[1]) == (0, 0) and np.isnan(perdida[1])
+    assert np.isfinite(perdida[[0, 2]]).all()
+    _, _, perdida, usados = lulu.descenso_gradiente(X, Y, mascara=mascara)
+    assert usados[1] == 0 and np.isnan(perdida[1])
+    _, _, perdida, usados = lulu.descenso_minilotes(X, Y, epocas=5, mascara=mascara)
+    assert usados[1] == 0 and np.isnan(perdida[1])
+
+
+def test_sin_mascara_no_cambia(conjuntos):
+    X, Y, _, _ = conjuntos
+    X, Y = X[:, :13], Y[:, :13]
+    w, b, perdida = lulu.ajuste_cerrado(X, Y, bloque=4)
+    np.testing.assert_allclose(perdida, lulu.loss_stats(w, b, lulu.estadisticas_lote(X, Y)))
+    for fila in range(3):
+        we, be = np.polyfit(X[fila], Y[fila], 1)
+        assert w[fila] == pytest.approx(we) and b[fila] == pytest.approx(be)
@@ -0,0 +1,66 @@
+import random
+from collections import Counter
+
+from fastapi.testclient import TestClient
+
+import p4U3
+from p4U3 import Alumno, AlmacenAlumnos
+
+
+def alumnos_aleatorios(cantidad, semilla=0):
+    azar = random.Random(semilla)
+    return [
+        Alumno(
+            nombre=f"Alumno {i}",
+            edad=azar.randint(5, 100),
+            correo=f"alumno{i}@escuela.mx",
+            grupo=azar.choice(["A", "B", "C", "D"]),
+            origen=azar.choice(["rural", "urbano"]),
+        )
+        for i in range(cantidad)
+    ]
+
+
+def test_contadores_coinciden_con_recuento():
+    almacen = AlmacenAlumnos()
+    for alumno in alumnos_aleatorios(500):
+        almacen.agregar(alumno)
+
+    assert almacen.total_por_grupo == dict(Counter(a.grupo for a in almacen))
+    assert almacen.total_por_origen == {
+        "rural": sum(a.origen == "rural" for a in almacen),
+        "urbano": sum(a.origen == "urbano" for a in almacen),
+    }
+    assert sum(almacen.total_por_grupo.values()) == len(almacen)
+
+
+def test_filtrar_coincide_con_recorrido_completo():
+    almacen = AlmacenAlumnos()
+    for alumno in alumnos_aleatorios(300, semilla=1):
+        almacen.agregar(alumno)
+
+    for grupo in (None, "A", "Z"):
+        for edad_minima in (None, 18, 90):
+            for origen in (None, "rural"):
+                esperado = [
+                    a for a in almacen
+                    if (not grupo or a.grupo == grupo)
+                    and (not edad_minima or a.edad >= edad_minima)
+                    and (not origen or a.origen == origen)
+                ]
+                assert almacen.filtrar(grupo, edad_minima, origen) == esperado
+
+
+def test_estadisticas_desglose(monkeypatch):
+    monkeypatch.setattr(p4U3, "base_alumnos", AlmacenAlumnos())
+    cliente = TestClient(p4U3.app)
+    alumnos = alumnos_aleatorios(50, semilla=2)
+    for alumno in alumnos:
+        assert cliente.post("/registrar", json=alumno.model_dump()).status_code == 200
+    # Un correo repetido no debe mover los contadores
+    assert cliente.post("/registrar", json=alumnos[0].model_dump()).status_code == 400
+
+    datos = cliente.get("/estadisticas", params={"desglose": True}).json()
+    assert datos["total"] == len(alumnos)
+    assert datos["por_grupo"] == dict(Counter(a.grupo for a in alumnos))
+    assert datos["por_origen"]["rural"] == sum(a.origen == "rural" for a in alumnos)
@@ -0,0 +1,411 @@
+import hashlib
+import importlib
+import io
+import os
+import sqlite3
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+
+@pytest.fixture
+def practica10(tmp_path, monkeypatch):
+    # Carpetas de subida y base SQLite dentro de un directorio temporal
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'fotos.db'}")
+    monkeypatch.setenv("MAX_TAMANO_FOTO", str(256 * 1024))
+    sys.modules.pop("practica10", None)
+    modulo = importlib.import_module("practica10")
+    yield modulo
+    sys.modules.pop("practica10", None)
+
+
+def imagen_png(color=(200, 30, 30), lado=64):
+    buffer = io.BytesIO()
+    Image.new("RGB", (lado, lado), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def temporales(practica10):
+    return [n for n in os.listdir(practica10.TMP_DIR) if n.endswith(".part")]
+
+
+def test_subida_guarda_por_contenido(practica10):
+    contenido = imagen_png()
+    with TestClient(practica10.app) as cliente:
+        respuesta = cliente.post("/fotos/", data={"descripcion": "Patio"}, files={"file": ("patio.PNG", contenido, "image/png")})
+    assert respuesta.status_code == 200, respuesta.text
+    foto = respuesta.json()["foto"]
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    assert foto["ruta_foto"] == f"uploads/{sha256}.png"
+    assert foto["descripcion"] == "Patio"
+    with open(foto["ruta_foto"], "rb") as f:
+        assert f.read() == contenido
+    assert temporales(practica10) == []
+
+
+def test_foto_demasiado_grande_se_corta_al_recibir(practica10):
+    cliente = TestClient(practica10.app)
+    grande = b"x" * (practica10.MAX_TAMANO_FOTO + 1)
+
+    # Cuerpo transmitido sin Content-Length: el límite se revisa por bloques
+    frontera = "frontera123"
+    def cuerpo():
+        yield (f"--{frontera}\r\nContent-Disposition: form-data; name=\"descripcion\"\r\n\r\nGrande\r\n"
+               f"--{frontera}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"g.jpg\"\r\n"
+               "Content-Type: image/jpeg\r\n\r\n").encode()
+        for inicio in range(0, len(grande), 64 * 1024):
+            yield grande[inicio:inicio + 64 * 1024]
+        yield f"\r\n--{frontera}--\r\n".encode()
+
+    respuesta = cliente.post(
+        "/fotos/", content=cuerpo(), headers={"Content-Type": f"multipart/form-data; boundary={frontera}"}
+    )
+    assert respuesta.status_code == 413
+    assert temporales(practica10) == []
+
+
+def test_content_length_excesivo_se_rechaza_sin_leer(practica10):
+    def cuerpo():
+        yield b"--x--\r\n"
+
+    cliente = TestClient(practica10.app)
+    respuesta = cliente.post(
+        "/fotos/",
+        content=cuerpo(),
+        headers={
+            "Content-Type": "multipart/form-data; boundary=x",
+            "Content-Length": str(practica10.MAX_TAMANO_FOTO + practica10.MARGEN_FORMULARIO + 1),
+        },
+    )
+    assert respuesta.status_code == 413
+
+
+def test_faltan_campos(practica10):
+    cliente = TestClient(practica10.app)
+    respuesta = cliente.post("/fotos/", data={"descripcion": "Sin archivo"}, files={"otro": ("a.txt", b"hola")})
+    assert respuesta.status_code == 422
+    assert temporales(practica10) == []
+
+
+def archivos_subidos(practica10):
+    return sorted(n for n in os.listdir(practica10.UPLOAD_DIR) if os.path.isfile(os.path.join(practica10.UPLOAD_DIR, n)))
+
+
+def test_fallo_al_guardar_no_deja_archivo_huerfano(practica10, monkeypatch):
+    contenido = imagen_png()
+    temporal = os.path.join(practica10.TMP_DIR, "prueba.part")
+    with open(temporal, "wb") as f:
+        f.write(contenido)
+
+    # La foto no se puede guardar: el commit falla después de mover el archivo
+    def commit_fallido(self):
+        raise RuntimeError("se perdió la conexión")
+    monkeypatch.setattr(practica10.SessionLocal.class_, "commit", commit_fallido)
+
+    with pytest.raises(RuntimeError):
+        practica10.guardar_foto("Patio", temporal, hashlib.sha256(contenido).hexdigest(), len(contenido), ".png")
+    assert archivos_subidos(practica10) == []
+    assert not os.path.exists(temporal)
+
+
+def test_borrar_foto_libera_blob_compartido(practica10):
+    contenido = imagen_png()
+    with TestClient(practica10.app) as cliente:
+        ids = [
+            cliente.post("/fotos/", data={"descripcion": f"Copia {i}"}, files={"file": ("a.png", contenido)}).json()["foto"]["id"]
+            for i in range(2)
+        ]
+        # Las dos fotos comparten un solo archivo
+        assert len(archivos_subidos(practica10)) == 1
+
+        assert cliente.delete(f"/fotos/{ids[0]}").status_code == 200
+        assert len(archivos_subidos(practica10)) == 1
+        db = practica10.SessionLocal()
+        assert db.query(practica10.Blob.referencias).scalar() == 1
+        db.close()
+
+        assert cliente.delete(f"/fotos/{ids[1]}").status_code == 200
+        assert archivos_subidos(practica10) == []
+        db = practica10.SessionLocal()
+        assert db.query(practica10.Blob).count() == 0
+        db.close()
+
+
+def test_baja_y_referencia_en_la_misma_transaccion(practica10, monkeypatch):
+    contenido = imagen_png()
+    with TestClient(practica10.app) as cliente:
+        id = cliente.post("/fotos/", data={"descripcion": "Patio"}, files={"file": ("a.png", contenido)}).json()["foto"]["id"]
+
+    # El proceso "se cae" al hacer commit: ni la foto ni el contador cambian
+    def commit_fallido(self):
+        raise RuntimeError("caída")
+    with monkeypatch.context() as parche:
+        parche.setattr(practica10.SessionLocal.class_, "commit", commit_fallido)
+        with pytest.raises(RuntimeError):
+            practica10.borrar_foto(id)
+
+    db = practica10.SessionLocal()
+    assert db.get(practica10.Foto, id) is not None
+    assert db.query(practica10.Blob.referencias).scalar() == 1
+    db.close()
+
+
+def blob_sin_referencias(practica10, contenido):
+    # Sube una foto y la da de baja sin recolectar: queda un blob con 0 referencias
+    with TestClient(practica10.app) as cliente:
+        foto = cliente.post("/fotos/", data={"descripcion": "Patio"}, files={"file": ("a.png", contenido)}).json()["foto"]
+    db = practica10.SessionLocal()
+    db.delete(db.get(practica10.Foto, foto["id"]))
+    practica10.liberar_blob(db, hashlib.sha256(contenido).hexdigest())
+    db.commit()
+    return db, foto["ruta_foto"]
+
+
+def test_subida_durante_la_recoleccion_conserva_su_archivo(practica10, monkeypatch):
+    contenido = imagen_png()
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    db, ruta = blob_sin_referencias(practica10, contenido)
+
+    # Justo después del commit del recolector llega una subida del mismo contenido
+    commit_original = practica10.SessionLocal.class_.commit
+    nuevas = []
+    def commit_y_subida(self):
+        commit_original(self)
+        if self is db and not nuevas:
+            temporal = os.path.join(practica10.TMP_DIR, "otra.part")
+            with open(temporal, "wb") as f:
+                f.write(contenido)
+            nuevas.append(practica10.guardar_foto("Otra vez", temporal, sha256, len(contenido), ".png"))
+    monkeypatch.setattr(practica10.SessionLocal.class_, "commit", commit_y_subida)
+    practica10.recolectar_blobs(db, sha256)
+    db.close()
+
+    assert nuevas[0].ruta_foto == ruta
+    with open(ruta, "rb") as f:
+        assert f.read() == contenido
+    assert [n for n in os.listdir(practica10.TMP_DIR) if n.endswith(".borrado")] == []
+
+
+def test_recoleccion_fallida_deja_los_archivos(practica10, monkeypatch):
+    contenido = imagen_png()
+    db, ruta = blob_sin_referencias(practica10, contenido)
+
+    def commit_fallido(self):
+        raise RuntimeError("caída")
+    with monkeypatch.context() as parche:
+        parche.setattr(practica10.SessionLocal.class_, "commit", commit_fallido)
+        with pytest.raises(RuntimeError):
+            practica10.recolectar_blobs(db)
+    assert os.path.exists(ruta)
+    assert db.query(practica10.Blob).count() == 1
+
+    # Más tarde la recolección sí termina
+    practica10.recolectar_blobs(db)
+    db.close()
+    assert not os.path.exists(ruta)
+    assert os.listdir(practica10.TMP_DIR) == ["sesiones"]
+
+
+@pytest.fixture
+def base_anterior(tmp_path, monkeypatch):
+    # Tabla 'P10_foto' tal como la creaba la versión anterior, con una foto
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'fotos.db'}")
+    conexion = sqlite3.connect(tmp_path / "fotos.db")
+    conexion.execute(
+        "CREATE TABLE P10_foto (id INTEGER NOT NULL PRIMARY KEY, descripcion VARCHAR(255) NOT NULL,"
+        " ruta_foto VARCHAR(255) NOT NULL, fecha TIMESTAMP)"
+    )
+    conexion.execute("INSERT INTO P10_foto VALUES (1, 'Anterior', 'uploads/legacy.png', '2024-01-01 00:00:00')")
+    conexion.commit()
+    conexion.close()
+    os.makedirs(tmp_path / "uploads")
+    (tmp_path / "uploads" / "legacy.png").write_bytes(imagen_png(color=(0, 0, 200)))
+    sys.modules.pop("practica10", None)
+    yield importlib.import_module("practica10")
+    sys.modules.pop("practica10", None)
+
+
+def test_migra_tabla_anterior(base_anterior):
+    practica10 = base_anterior
+    columnas = {c["name"] for c in practica10.inspect(practica10.engine).get_columns("P10_foto")}
+    assert "sha256" in columnas
+    indices = {i["name"] for i in practica10.inspect(practica10.engine).get_indexes("P10_foto")}
+    assert {"idx_foto_fecha_id", "ix_P10_foto_sha256"} <= indices
+
+    cliente = TestClient(practica10.app)
+    respuesta = cliente.get("/fotos/")
+    assert respuesta.status_code == 200, respuesta.text
+    assert [f["ruta_foto"] for f in respuesta.json()] == ["uploads/legacy.png"]
+    nueva = cliente.post("/fotos/", data={"descripcion": "Nueva"}, files={"file": ("n.png", imagen_png())})
+    assert nueva.status_code == 200
+    assert cliente.delete("/fotos/1").status_code == 200
+
+    # Importar otra vez (otro arranque) no vuelve a migrar ni falla
+    sys.modules.pop("practica10", None)
+    importlib.import_module("practica10")
+
+
+def test_variantes_de_fotos_sin_hash(base_anterior):
+    practica10 = base_anterior
+    # Dos fotos anteriores cuyo nombre solo difiere en la extensión
+    with open("uploads/legacy.jpg", "wb") as f:
+        f.write(imagen_png(color=(0, 200, 0)))
+    db = practica10.SessionLocal()
+    db.query(practica10.Foto).filter_by(id=1).update({"ruta_foto": "uploads/legacy.png"})
+    db.add(practica10.Foto(id=2, descripcion="Otra anterior", ruta_foto="uploads/legacy.jpg"))
+    db.commit()
+    db.close()
+
+    cliente = TestClient(practica10.app)
+    fotos = {f["id"]: f for f in cliente.get("/fotos/").json()}
+    assert "sha256" not in fotos[1]
+    miniaturas = []
+    for id in (1, 2):
+        url = fotos[id]["variantes"]["thumb"]
+        assert url == f"/fotos/{id}/variantes/thumb"
+        respuesta = cliente.get(url)
+        assert respuesta.status_code == 200
+        miniaturas.append(respuesta.content)
+    # Cada foto tiene su propia miniatura
+    assert miniaturas[0] != miniaturas[1]
+
+    # Las fotos nuevas siguen usando URLs por contenido
+    nueva = cliente.post("/fotos/", data={"descripcion": "Nueva"}, files={"file": ("n.png", imagen_png())}).json()["foto"]
+    assert nueva["variantes"]["thumb"].startswith("/media/variantes/")
+    assert "sha256" not in nueva
+
+
+def crear_subida(cliente, contenido):
+    respuesta = cliente.post("/fotos/subidas", data={"descripcion": "Reanudable", "tamano": len(contenido), "nombre": "r.png"})
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()["id"]
+
+
+def test_subida_reanudable_completa(practica10):
+    contenido = imagen_png()
+    cliente = TestClient(practica10.app)
+    id = crear_subida(cliente, contenido)
+    mitad = len(contenido) // 2
+    # Incompleta: no se puede finalizar, pero la sesión sigue aceptando bloques
+    assert cliente.put(f"/fotos/subidas/{id}?offset=0", content=contenido[:mitad]).status_code == 200
+    assert cliente.post(f"/fotos/subidas/{id}/finalizar").status_code == 409
+    assert cliente.put(f"/fotos/subidas/{id}?offset={mitad}", content=contenido[mitad:]).json()["completa"]
+
+    respuesta = cliente.post(f"/fotos/subidas/{id}/finalizar")
+    assert respuesta.status_code == 200, respuesta.text
+    with open(respuesta.json()["foto"]["ruta_foto"], "rb") as f:
+        assert f.read() == contenido
+    assert cliente.get(f"/fotos/subidas/{id}").status_code == 404
+
+
+def test_sesion_finalizando_rechaza_bloques(practica10):
+    contenido = imagen_png()
+    cliente = TestClient(practica10.app)
+    id = crear_subida(cliente, contenido)
+    cliente.put(f"/fotos/subidas/{id}?offset=0", content=contenido)
+
+    # Estado que deja finalizar_subida mientras calcula el hash y guarda la foto
+    practica10.marcar_finalizando(id)
+    respuesta = cliente.put(f"/fotos/subidas/{id}?offset=0", content=b"\0" * len(contenido))
+    assert respuesta.status_code == 409
+    datos, _ = practica10.rutas_sesion(id)
+    with open(datos, "rb") as f:
+        assert f.read() == contenido
+
+    # El hilo que escribe vuelve a comprobar el estado bajo el lock
+    fd = os.open(datos, os.O_WRONLY)
+    try:
+        with pytest.raises(practica10.HTTPException):
+            practica10.escribir_bloque(id, fd, 0, b"\0" * 8)
+    finally:
+        os.close(fd)
+    with open(datos, "rb") as f:
+        assert f.read() == contenido
+
+    # Una segunda finalización simultánea también se rechaza
+    assert cliente.post(f"/fotos/subidas/{id}/finalizar").status_code == 409
+
+
+def test_variantes_direccionadas_por_contenido(practica10):
+    contenido = imagen_png(lado=400)
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    cliente = TestClient(practica10.app)
+    foto = cliente.post("/fotos/", data={"descripcion": "Patio"}, files={"file": ("patio.png", contenido, "image/png")}).json()["foto"]
+    url = foto["variantes"]["thumb"]
+    assert url.startswith(f"/media/variantes/{sha256}_thumb_")
+
+    # Se genera al pedirla si todavía no existe, y se cachea como inmutable
+    respuesta = cliente.get(url)
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"] == "image/webp"
+    assert respuesta.headers["cache-control"] == practica10.CACHE_INMUTABLE
+    assert cliente.get(url, headers={"If-None-Match": respuesta.headers["etag"]}).status_code == 304
+
+    # La URL por id puede cambiar de contenido: siempre se revalida
+    respuesta = cliente.get(f"/fotos/{foto['id']}/variantes/thumb")
+    assert respuesta.headers["cache-control"] == "no-cache"
+
+    # Un hash sin blob no genera nada
+    assert cliente.get(url.replace(sha256, "0" * 64)).status_code == 404
+
+
+def test_finalizar_fallido_se_puede_reintentar(practica10, monkeypatch):
+    contenido = imagen_png()
+    cliente = TestClient(practica10.app)
+    id = crear_subida(cliente, contenido)
+    cliente.put(f"/fotos/subidas/{id}?offset=0", content=contenido)
+
+    # Falla la base de datos una vez: la sesión sigue completa y abierta
+    def commit_fallido(self):
+        raise RuntimeError("se perdió la conexión")
+    with monkeypatch.context() as parche:
+        parche.setattr(practica10.SessionLocal.class_, "commit", commit_fallido)
+        assert cliente.post(f"/fotos/subidas/{id}/finalizar").status_code == 500
+    estado = cliente.get(f"/fotos/subidas/{id}")
+    assert estado.status_code == 200 and estado.json()["completa"]
+    assert archivos_subidos(practica10) == [] and temporales(practica10) == []
+
+    respuesta = cliente.post(f"/fotos/subidas/{id}/finalizar")
+    assert respuesta.status_code == 200, respuesta.text
+    with open(respuesta.json()["foto"]["ruta_foto"], "rb") as f:
+        assert f.read() == contenido
+    assert cliente.get(f"/fotos/subidas/{id}").status_code == 404
+
+
+def test_marca_de_finalizando_vence(practica10, monkeypatch):
+    contenido = imagen_png()
+    cliente = TestClient(practica10.app)
+    id = crear_subida(cliente, contenido)
+    cliente.put(f"/fotos/subidas/{id}?offset=0", content=contenido)
+
+    # El proceso se cayó después de marcar la sesión
+    practica10.marcar_finalizando(id)
+    assert cliente.post(f"/fotos/subidas/{id}/finalizar").status_code == 409
+    despues = practica10.time.time() + practica10.SESION_FINALIZAR_MAX + 1
+    monkeypatch.setattr(practica10.time, "time", lambda: despues)
+    assert cliente.post(f"/fotos/subidas/{id}/finalizar").status_code == 200
+
+
+def test_limite_de_sesiones_y_bytes_reservados(practica10, monkeypatch):
+    monkeypatch.setattr(practica10, "MAX_SESIONES", 2)
+    monkeypatch.setattr(practica10, "MAX_RESERVA_SESIONES", 3000)
+    cliente = TestClient(practica10.app)
+
+    def crear(tamano):
+        return cliente.post("/fotos/subidas", data={"descripcion": "x", "tamano": tamano})
+
+    primera = crear(1000).json()["id"]
+    # Cabe en número de sesiones, pero no en bytes reservados
+    respuesta = crear(2500)
+    assert respuesta.status_code == 503 and respuesta.headers["retry-after"] == "60"
+    crear(1000)
+    assert crear(10).status_code == 503
+    assert len(os.listdir(practica10.SESIONES_DIR)) == 4
+
+    # Al cancelar una sesión se libera su lugar
+    assert cliente.delete(f"/fotos/subidas/{primera}").status_code == 200
+    assert crear(1000).status_code == 200
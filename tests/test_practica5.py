@@ -0,0 +1,77 @@
+import importlib
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def practica5(tmp_path, monkeypatch):
+    # Cada prueba usa su propia base; el módulo crea las tablas al importarse
+    monkeypatch.setenv("ALUMNOS_DB", str(tmp_path / "alumnos.db"))
+    sys.modules.pop("practica5", None)
+    modulo = importlib.import_module("practica5")
+    yield modulo
+    sys.modules.pop("practica5", None)
+
+
+def alumno(i, **cambios):
+    datos = {
+        "nombre": f"Alumno {i}",
+        "edad": 20,
+        "correo": f"alumno{i}@escuela.mx",
+        "grupo": "A",
+        "origen": "urbano",
+    }
+    datos.update(cambios)
+    return datos
+
+
+def test_correo_duplicado_no_deja_transaccion_abierta(practica5):
+    cliente = TestClient(practica5.app)
+    assert cliente.post("/registrar", json=alumno(1)).status_code == 200
+    assert cliente.post("/registrar", json=alumno(1)).status_code == 400
+
+    # Otra conexión debe poder escribir de inmediato
+    otra = practica5.sqlite3.connect(practica5.DB_PATH, timeout=0.1)
+    otra.execute("INSERT INTO alumnos (nombre, edad, correo, grupo, origen) VALUES ('Otro', 20, 'otro@escuela.mx', 'B', 'rural')")
+    otra.commit()
+    otra.close()
+
+    respuesta = cliente.post("/registrar/lote", json=[alumno(2), alumno(1)])
+    assert respuesta.status_code == 200
+    assert respuesta.json()["insertados"] == 1
+    assert [e["fila"] for e in respuesta.json()["errores"]] == [1]
+
+
+def test_actualizar_con_correo_duplicado(practica5):
+    cliente = TestClient(practica5.app)
+    cliente.post("/registrar", json=alumno(1))
+    cliente.post("/registrar", json=alumno(2))
+    assert cliente.put("/actualizar/2", json=alumno(1)).status_code == 400
+    assert cliente.post("/registrar", json=alumno(3)).status_code == 200
+
+    estadisticas = cliente.get("/estadisticas").json()
+    assert estadisticas["total_alumnos_registrados"] == 3
+    assert estadisticas["total_por_grupo"] == {"A": 3}
+
+
+def test_estadisticas_vencen_si_escribe_otro_proceso(practica5, monkeypatch):
+    monkeypatch.setattr(practica5, "CACHE_ESTADISTICAS_TTL", 0.2)
+    cliente = TestClient(practica5.app)
+    cliente.post("/registrar", json=alumno(1))
+    assert cliente.get("/estadisticas").json()["total_alumnos_registrados"] == 1
+
+    # Otro worker escribe directo en la base: la caché de este proceso no se entera
+    otra = practica5.sqlite3.connect(practica5.DB_PATH)
+    otra.execute("INSERT INTO alumnos (nombre, edad, correo, grupo, origen) VALUES ('Otro', 20, 'otro@escuela.mx', 'B', 'rural')")
+    otra.commit()
+    otra.close()
+    assert cliente.get("/estadisticas").json()["total_alumnos_registrados"] == 1
+
+    # Al vencer el TTL se vuelve a consultar
+    time.sleep(0.25)
+    estadisticas = cliente.get("/estadisticas").json()
+    assert estadisticas["total_alumnos_registrados"] == 2
+    assert estadisticas["total_por_grupo"] == {"A": 1, "B": 1}
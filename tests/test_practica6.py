@@ -0,0 +1,42 @@
+import importlib
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def practica6(tmp_path, monkeypatch):
+    # SQLite con aiosqlite en lugar de MySQL
+    monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'escuela.db'}")
+    sys.modules.pop("practica6", None)
+    modulo = importlib.import_module("practica6")
+    yield modulo
+    sys.modules.pop("practica6", None)
+
+
+def test_cache_no_guarda_lectura_anterior_a_invalidacion(practica6):
+    cache = practica6.CacheLectura()
+    # Un GET lee la versión y consulta la fila vieja...
+    version = cache.version
+    # ...mientras tanto un PUT hace commit e invalida...
+    cache.invalidar([1])
+    # ...y el GET termina después: su resultado no debe quedar en la caché
+    cache.guardar(1, {"id": 1, "nombre": "viejo"}, version)
+    assert cache.obtener(1) is None
+
+    cache.guardar(1, {"id": 1, "nombre": "nuevo"}, cache.version)
+    assert cache.obtener(1) == {"id": 1, "nombre": "nuevo"}
+
+
+def test_get_refleja_put(practica6):
+    with TestClient(practica6.app) as cliente:
+        creado = cliente.post("/alumnos/", json={"nombre": "Ana", "edad": 20, "carrera": "ISC"}).json()
+        ruta = f"/alumnos/{creado['id']}"
+        assert cliente.get(ruta).json()["nombre"] == "Ana"
+
+        cliente.put(ruta, json={"nombre": "Ana María", "edad": 21, "carrera": "ISC"})
+        assert cliente.get(ruta).json()["nombre"] == "Ana María"
+
+        cliente.delete(ruta)
+        assert cliente.get(ruta).status_code == 404
@@ -0,0 +1,205 @@
+import importlib
+import sqlite3
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+class GeocodificadorFalso:
+    # Sustituye a Nominatim: responde al instante y cuenta las llamadas
+    def __init__(self):
+        self.llamadas = []
+        self.horas = []
+
+    async def __call__(self, lat, lon):
+        self.llamadas.append((lat, lon))
+        self.horas.append(time.monotonic())
+        return f"Calle {lat:.4f}, {lon:.4f}"
+
+
+def importar(monkeypatch, ruta_db):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{ruta_db}")
+    sys.modules.pop("practica9", None)
+    modulo = importlib.import_module("practica9")
+    modulo.geocache.geocodificador = GeocodificadorFalso()
+    return modulo
+
+
+@pytest.fixture
+def practica9(tmp_path, monkeypatch):
+    yield importar(monkeypatch, tmp_path / "asistencia.db")
+    sys.modules.pop("practica9", None)
+
+
+@pytest.fixture
+def base_anterior(tmp_path, monkeypatch):
+    # Tablas tal como las creaba la versión anterior de modelo.sql, con un registro
+    conexion = sqlite3.connect(tmp_path / "asistencia.db")
+    conexion.executescript("""
+        CREATE TABLE P9_users (
+            user_id INTEGER PRIMARY KEY, username VARCHAR(50) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL, full_name VARCHAR(100), created_at TIMESTAMP
+        );
+        CREATE TABLE P9_attendance (
+            attendance_id INTEGER PRIMARY KEY, user_id INT NOT NULL REFERENCES P9_users(user_id),
+            latitude DECIMAL(10,8) NOT NULL, longitude DECIMAL(11,8) NOT NULL,
+            address VARCHAR(255), registered_at TIMESTAMP
+        );
+        INSERT INTO P9_users VALUES (1, 'ana', 'x', 'Ana', '2024-01-01 00:00:00');
+        INSERT INTO P9_attendance VALUES (1, 1, 19.4326, -99.1332, 'Zócalo', '2024-01-01 08:00:00');
+    """)
+    conexion.close()
+    yield importar(monkeypatch, tmp_path / "asistencia.db")
+    sys.modules.pop("practica9", None)
+
+
+def test_migra_tabla_anterior(base_anterior, monkeypatch, tmp_path):
+    practica9 = base_anterior
+    inspector = practica9.inspect(practica9.engine)
+    assert {"geohash", "client_key"} <= {c["name"] for c in inspector.get_columns("P9_attendance")}
+    assert {"idx_attendance_user_registered", "idx_attendance_geohash", "uq_attendance_user_client_key"} <= {
+        i["name"] for i in inspector.get_indexes("P9_attendance")
+    }
+
+    cliente = TestClient(practica9.app)
+    historial = cliente.get("/attendance/history", params={"user_id": 1})
+    assert historial.status_code == 200, historial.text
+    assert [r["address"] for r in historial.json()] == ["Zócalo"]
+    assert cliente.post("/attendance/", json={"user_id": 1, "latitude": 19.5, "longitude": -99.2}).status_code == 200
+
+    # El registro anterior recibe su geohash y aparece en las búsquedas por cercanía
+    practica9.rellenar_geohash()
+    cercanos = cliente.get("/attendance/nearby", params={"latitude": 19.4326, "longitude": -99.1332, "radius_m": 50})
+    assert [r["attendance_id"] for r in cercanos.json()] == [1]
+
+    # La llave del cliente es única por usuario también en la tabla migrada
+    lote = [{"user_id": 1, "latitude": 19.4, "longitude": -99.1, "client_key": "k1", "registered_at": "2024-02-01T08:00:00"}]
+    assert len(cliente.post("/attendance/batch", json=lote).json()["saved"]) == 1
+    assert cliente.post("/attendance/batch", json=lote).json()["duplicates"] == ["k1"]
+
+    # Otro arranque no vuelve a migrar ni falla
+    importar(monkeypatch, tmp_path / "asistencia.db")
+
+
+def test_base_nueva_arranca_dos_veces(practica9, monkeypatch, tmp_path):
+    importar(monkeypatch, tmp_path / "asistencia.db")
+
+
+def test_historial_de_registros_hechos_por_el_endpoint(practica9):
+    cliente = TestClient(practica9.app)
+    db = practica9.SessionLocal()
+    db.add(practica9.User(user_id=1, username="ana", password_hash="x"))
+    db.commit()
+    db.close()
+    creados = []
+    for i in range(5):
+        respuesta = cliente.post("/attendance/", json={"user_id": 1, "latitude": 19.43 + i * 1e-5, "longitude": -99.13})
+        assert respuesta.status_code == 200, respuesta.text
+        creados.append(respuesta.json())
+    # Cada registro tiene su propia hora (no la del momento de importar el módulo)
+    horas = [c["registered_at"] for c in creados]
+    assert len(set(horas)) == 5 and horas == sorted(horas)
+
+    # Paginación de 2 en 2 con el cursor (registered_at, attendance_id)
+    vistos, params = [], {"user_id": 1, "limit": 2}
+    while True:
+        pagina = cliente.get("/attendance/history", params=params)
+        vistos += [r["registered_at"] for r in pagina.json()]
+        if "x-next-before" not in pagina.headers:
+            break
+        params.update(before=pagina.headers["x-next-before"], before_id=pagina.headers["x-next-before-id"])
+    assert vistos == horas[::-1]
+
+    # Ventana [since, until): el segundo y el tercer registro
+    ventana = cliente.get("/attendance/history", params={"user_id": 1, "since": horas[1], "until": horas[3]})
+    assert [r["registered_at"] for r in ventana.json()] == [horas[2], horas[1]]
+    cercanos = cliente.get("/attendance/nearby", params={
+        "latitude": 19.43, "longitude": -99.13, "radius_m": 100, "since": horas[1], "until": horas[3],
+    })
+    assert sorted(r["attendance_id"] for r in cercanos.json()) == [creados[1]["attendance_id"], creados[2]["attendance_id"]]
+
+
+def crear_usuarios(practica9, *ids):
+    db = practica9.SessionLocal()
+    db.add_all(practica9.User(user_id=i, username=f"u{i}", password_hash="x") for i in ids)
+    db.commit()
+    db.close()
+
+
+def registro(user_id, client_key, lat=19.43):
+    return {"user_id": user_id, "latitude": lat, "longitude": -99.13, "client_key": client_key, "registered_at": "2024-03-01T08:00:00"}
+
+
+def test_lote_idempotente_con_duplicados_y_usuarios_desconocidos(practica9):
+    crear_usuarios(practica9, 1, 2)
+    cliente = TestClient(practica9.app)
+    lote = [registro(1, "k1"), registro(1, "k1"), registro(2, "k1"), registro(99, "k2")]
+    respuesta = cliente.post("/attendance/batch", json=lote).json()
+    # La misma llave puede repetirse entre usuarios, no dentro del mismo usuario
+    assert [(r["client_key"], r["address"]) for r in respuesta["saved"]] == [("k1", practica9.DIRECCION_PENDIENTE)] * 2
+    assert respuesta["duplicates"] == ["k1"]
+    assert respuesta["errors"] == [{"client_key": "k2", "detail": "Usuario no encontrado"}]
+
+    # El cliente reenvía el lote completo (por ejemplo, tras perder la respuesta)
+    otra = cliente.post("/attendance/batch", json=lote).json()
+    assert otra["saved"] == [] and otra["duplicates"] == ["k1", "k1", "k1"]
+    db = practica9.SessionLocal()
+    assert db.query(practica9.Attendance).count() == 2
+    db.close()
+
+
+def test_lote_reintenta_si_otra_peticion_guardo_la_llave(practica9, monkeypatch):
+    crear_usuarios(practica9, 1)
+    original = practica9.guardar_lote_asistencia
+    def con_carrera(db, items, direcciones):
+        if not con_carrera.hecho:
+            # Otra petición guarda k1 entre el filtro y el INSERT de esta
+            con_carrera.hecho = True
+            otra = practica9.SessionLocal()
+            otra.add(practica9.Attendance(user_id=1, latitude=19.43, longitude=-99.13, client_key="k1"))
+            otra.commit()
+            otra.close()
+        return original(db, items, direcciones)
+    con_carrera.hecho = False
+    monkeypatch.setattr(practica9, "guardar_lote_asistencia", con_carrera)
+
+    respuesta = TestClient(practica9.app).post("/attendance/batch", json=[registro(1, "k1"), registro(1, "k2")])
+    assert respuesta.status_code == 200, respuesta.text
+    assert [r["client_key"] for r in respuesta.json()["saved"]] == ["k2"]
+    assert respuesta.json()["duplicates"] == ["k1"]
+
+
+def test_lote_en_linea_respeta_el_intervalo_del_proveedor(practica9, monkeypatch):
+    crear_usuarios(practica9, 1)
+    monkeypatch.setattr(practica9.resolutor, "intervalo", 0.05)
+    falso = practica9.geocache.geocodificador
+    # Tres celdas distintas y una repetida: tres llamadas, separadas por el intervalo
+    lote = [registro(1, f"k{i}", lat=19.43 + i * 0.01) for i in range(3)] + [registro(1, "k3", lat=19.43)]
+    respuesta = TestClient(practica9.app).post("/attendance/batch", params={"diferido": "false"}, json=lote)
+    assert respuesta.status_code == 200, respuesta.text
+    assert all(r["address"].startswith("Calle") for r in respuesta.json()["saved"])
+    assert len(falso.llamadas) == 3
+    assert all(b - a >= 0.045 for a, b in zip(falso.horas, falso.horas[1:]))
+
+
+def test_login_de_usuario_inexistente_cuesta_lo_mismo(practica9, monkeypatch):
+    monkeypatch.setattr(sys.modules["practica9_hash"], "PBKDF2_ITERACIONES", 1000)
+    cliente = TestClient(practica9.app)
+    assert cliente.post("/register/", json={"username": "ana", "password": "secreta", "full_name": "Ana"}).status_code == 200
+
+    verificados = []
+    original = practica9.verificar_password
+    def contar(password, password_hash):
+        verificados.append(password_hash)
+        return original(password, password_hash)
+    monkeypatch.setattr(practica9, "verificar_password", contar)
+
+    assert cliente.post("/login/", json={"username": "ana", "password": "otra"}).status_code == 400
+    assert cliente.post("/login/", json={"username": "nadie", "password": "otra"}).status_code == 400
+    # Los dos fallos verifican un hash con el mismo algoritmo y costo
+    assert len(verificados) == 2
+    assert [h.split("$")[:2] for h in verificados] == [["pbkdf2_sha256", "1000"]] * 2
+    assert not practica9.necesita_rehash(verificados[1])
+    assert cliente.post("/login/", json={"username": "ana", "password": "secreta"}).json()["msg"] == "Login exitoso"
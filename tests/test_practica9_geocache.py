@@ -0,0 +1,84 @@
+import asyncio
+import importlib
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def practica9(tmp_path, monkeypatch):
+    # SQLite en lugar de MySQL; el módulo crea las tablas al importarse
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'asistencia.db'}")
+    sys.modules.pop("practica9", None)
+    modulo = importlib.import_module("practica9")
+    yield modulo
+    sys.modules.pop("practica9", None)
+
+
+class GeocodificadorFalso:
+    # Sustituye a Nominatim: responde al instante y cuenta las llamadas
+    def __init__(self, respuesta=None):
+        self.respuesta = respuesta
+        self.llamadas = []
+
+    async def __call__(self, lat, lon):
+        self.llamadas.append((lat, lon))
+        return self.respuesta or f"Calle {lat:.4f}, {lon:.4f}"
+
+
+def test_miss_y_hit_en_memoria(practica9):
+    falso = GeocodificadorFalso()
+    cache = practica9.CacheGeocodificacion(geocodificador=falso)
+
+    primera = asyncio.run(cache.resolver(19.43261, -99.13321))
+    # Coordenadas a pocos metros caen en la misma celda
+    segunda = asyncio.run(cache.resolver(19.43264, -99.13318))
+
+    assert primera == segunda
+    assert len(falso.llamadas) == 1
+    assert cache.metricas == {"hits_memoria": 1, "hits_bd": 0, "misses": 1}
+
+
+def test_hit_en_bd_con_memoria_vacia(practica9):
+    falso = GeocodificadorFalso()
+    asyncio.run(practica9.CacheGeocodificacion(geocodificador=falso).resolver(19.4326, -99.1332))
+
+    # Otro proceso (o un reinicio) empieza con la memoria vacía
+    otra = practica9.CacheGeocodificacion(geocodificador=falso)
+    asyncio.run(otra.resolver(19.4326, -99.1332))
+    asyncio.run(otra.resolver(19.4326, -99.1332))
+
+    assert len(falso.llamadas) == 1
+    assert otra.metricas == {"hits_memoria": 1, "hits_bd": 1, "misses": 0}
+
+
+def test_vencimiento_en_memoria_y_bd(practica9, monkeypatch):
+    falso = GeocodificadorFalso()
+    cache = practica9.CacheGeocodificacion(geocodificador=falso, ttl=60)
+    asyncio.run(cache.resolver(19.4326, -99.1332))
+
+    # La entrada en memoria vence cuando pasa el TTL
+    reloj = practica9.time.monotonic() + 61
+    monkeypatch.setattr(practica9.time, "monotonic", lambda: reloj)
+    # Y la fila en la BD también se envejece más allá del TTL
+    db = practica9.SessionLocal()
+    fila = db.get(practica9.GeoCache, cache.llave(19.4326, -99.1332))
+    fila.updated_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=120)
+    db.commit()
+    db.close()
+
+    asyncio.run(cache.resolver(19.4326, -99.1332))
+    assert len(falso.llamadas) == 2
+    assert cache.metricas == {"hits_memoria": 0, "hits_bd": 0, "misses": 2}
+
+
+def test_fallos_no_se_guardan(practica9):
+    falso = GeocodificadorFalso(respuesta=practica9.DIRECCION_NO_DISPONIBLE)
+    cache = practica9.CacheGeocodificacion(geocodificador=falso)
+
+    for _ in range(2):
+        assert asyncio.run(cache.resolver(19.4326, -99.1332)) == practica9.DIRECCION_NO_DISPONIBLE
+    # Cada petición vuelve a intentar con el proveedor
+    assert len(falso.llamadas) == 2
+    assert cache.metricas["misses"] == 2
@@ -0,0 +1,85 @@
+import asyncio
+import importlib
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def practica9(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'asistencia.db'}")
+    sys.modules.pop("practica9", None)
+    modulo = importlib.import_module("practica9")
+    yield modulo
+    sys.modules.pop("practica9", None)
+
+
+class GeocodificadorFalso:
+    def __init__(self, disponible):
+        self.disponible = disponible
+        self.llamadas = 0
+
+    async def __call__(self, lat, lon):
+        self.llamadas += 1
+        if not self.disponible:
+            return "Dirección no disponible"
+        return f"Calle {lat:.4f}"
+
+
+def guardar_pendientes(practica9, cantidad):
+    db = practica9.SessionLocal()
+    db.add(practica9.User(user_id=1, username="ana", password_hash="x"))
+    db.add_all(
+        practica9.Attendance(user_id=1, latitude=19 + i * 0.01, longitude=-99, address=practica9.DIRECCION_PENDIENTE)
+        for i in range(cantidad)
+    )
+    db.commit()
+    db.close()
+
+
+def direcciones(practica9):
+    db = practica9.SessionLocal()
+    try:
+        return [a for (a,) in db.query(practica9.Attendance.address).order_by(practica9.Attendance.attendance_id)]
+    finally:
+        db.close()
+
+
+def siguiente_lote(resolutor):
+    async def correr():
+        # Cola vacía: _siguiente_lote recurre al barrido de la BD
+        resolutor.cola = asyncio.Queue()
+        return await resolutor._siguiente_lote()
+    return asyncio.run(correr())
+
+
+def barrer(resolutor):
+    asyncio.run(resolutor.procesar_lote(siguiente_lote(resolutor)))
+
+
+def test_fallo_del_proveedor_deja_pendiente_y_se_reintenta(practica9, monkeypatch):
+    guardar_pendientes(practica9, 3)
+    falso = GeocodificadorFalso(disponible=False)
+    monkeypatch.setattr(practica9.geocache, "geocodificador", falso)
+    resolutor = practica9.ResolutorDirecciones(lote=10, intervalo=0, barrido=0)
+
+    barrer(resolutor)
+    assert falso.llamadas == 3
+    assert direcciones(practica9) == [practica9.DIRECCION_PENDIENTE] * 3
+
+    # El proveedor vuelve: el barrido siguiente completa las direcciones
+    falso.disponible = True
+    barrer(resolutor)  # fin de la tabla, el cursor vuelve al inicio
+    barrer(resolutor)
+    assert direcciones(practica9) == ["Calle 19.0000", "Calle 19.0100", "Calle 19.0200"]
+
+
+def test_barrido_avanza_con_cursor(practica9, monkeypatch):
+    guardar_pendientes(practica9, 5)
+    monkeypatch.setattr(practica9.geocache, "geocodificador", GeocodificadorFalso(disponible=False))
+    resolutor = practica9.ResolutorDirecciones(lote=2, intervalo=0, barrido=0)
+
+    vistos = [[attendance_id for attendance_id, _, _ in siguiente_lote(resolutor)] for _ in range(4)]
+    # Cada barrido toma los siguientes pendientes y al final vuelve a empezar
+    assert vistos == [[1, 2], [3, 4], [5], []]
+    assert resolutor.cursor_barrido == 0